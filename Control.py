@@ -1,8 +1,17 @@
+import csv
 import tkinter as tk
-from tkinter import ttk, messagebox
-import json
+from tkinter import ttk, messagebox, filedialog
 from datetime import datetime
-import os
+
+from control_core import (
+    PERIODOS,
+    TIPOS_PEDIDO,
+    ErroValidacao,
+    PersistenceWorker,
+    Sistema,
+    criar_backend,
+    intervalo_periodo,
+)
 
 # Configurações de Cores
 DARK_BG = '#121212'
@@ -15,27 +24,17 @@ DARK_SELECTION = '#424242'
 FONT = ('Segoe UI', 10)
 FONT_BOLD = ('Segoe UI', 10, 'bold')
 
-# Arquivos de dados
-DADOS = {
-    'produtos': 'produtos.json',
-    'motoboys': 'motoboys.json',
-    'pedidos': 'pedidos.json'
-}
+# Linhas exibidas por página na aba Pedidos
+PEDIDOS_POR_PAGINA = 200
 
-PERCENTUAL_IFOOD = 0.20
+# Opção do filtro de motoboy da aba Pedidos que mostra todos os pedidos
+TODOS_MOTOBOYS = "Todos"
 
-class DataManager:
-    @staticmethod
-    def carregar(arquivo):
-        if not os.path.exists(arquivo):
-            return []
-        with open(arquivo, 'r', encoding='utf-8') as f:
-            return json.load(f)
+# Sugestões exibidas na lista do campo Produto a cada tecla
+SUGESTOES_PRODUTO = 30
 
-    @staticmethod
-    def salvar(arquivo, dados):
-        with open(arquivo, 'w', encoding='utf-8') as f:
-            json.dump(dados, f, indent=2, ensure_ascii=False)
+# Visões redesenhadas por _atualizar_visoes, nesta ordem
+VISOES = ['lista_produtos', 'lista_motoboys', 'lista_pedidos', 'comboboxes', 'financeiro']
 
 class App(tk.Tk):
     def __init__(self):
@@ -44,10 +43,66 @@ class App(tk.Tk):
         self.geometry("1000x700")
         self.configure(bg=DARK_BG)
         
+        # Linhas exibidas em cada Treeview: chave do registro -> (iid, valores)
+        self._linhas_treeview = {}
+        # iid -> chave do registro, para resolver seleções
+        self._chaves_por_iid = {}
+        # Visões marcadas para redesenhar no próximo ciclo ocioso do Tk
+        self._visoes_sujas = set()
+        # Nomes já enviados à Combobox de motoboys
+        self._valores_motoboys = None
+        # Carga do histórico inteiro em andamento, um bloco por ciclo do Tk
+        self._carregando_historico = False
+        # Exportações ainda gravando em segundo plano
+        self._exportacoes = []
+
         self._configurar_estilo()
         self._carregar_dados()
+        self._criar_menu_principal()
         self._criar_menu_contexto()
         self._criar_interface()
+        self.protocol("WM_DELETE_WINDOW", self._ao_fechar)
+        self._verificar_persistencia()
+        self._carregar_periodo()
+
+    def _agendar_atualizacao(self, *visoes):
+        """Marca visões (nomes em VISOES) como desatualizadas.
+
+        Cada visão marcada é redesenhada uma única vez no próximo ciclo ocioso
+        do Tk, não importa quantas ações a tenham marcado até lá.
+        """
+        agendar = not self._visoes_sujas
+        self._visoes_sujas.update(visoes)
+        if agendar:
+            self.after_idle(self._atualizar_visoes)
+
+    def _atualizar_visoes(self):
+        visoes, self._visoes_sujas = self._visoes_sujas, set()
+        for visao in VISOES:
+            if visao in visoes:
+                getattr(self, f'_atualizar_{visao}')()
+
+    def _verificar_persistencia(self):
+        self.sistema.backend.processar_resultados()
+        self.after(200, self._verificar_persistencia)
+
+    def _erro_persistencia(self, erro):
+        messagebox.showerror("Erro", f"Falha ao salvar os dados: {erro}")
+
+    def _ao_fechar(self):
+        exportacoes = [e for e in self._exportacoes if not e.concluido]
+        if exportacoes:
+            if not messagebox.askyesno(
+                    "Exportação em andamento",
+                    "Uma exportação ainda está sendo gravada. Aguardar o término e fechar?"):
+                return
+            # A exportação lê os meses não carregados pelo backend: termina antes de fechá-lo
+            for exportacao in exportacoes:
+                exportacao.aguardar()
+        # Descarrega as gravações pendentes antes de fechar a janela
+        self.sistema.fechar()
+        self.sistema.backend.processar_resultados()
+        self.destroy()
 
     def _configurar_estilo(self):
         style = ttk.Style(self)
@@ -97,6 +152,70 @@ class App(tk.Tk):
                  background=[('selected', DARK_SELECTION)],
                  foreground=[('selected', DARK_FG)])
 
+    def _criar_menu_principal(self):
+        barra = tk.Menu(self)
+        menu_arquivo = tk.Menu(barra, tearoff=0)
+        menu_arquivo.add_command(label="Importar Produtos...", command=lambda: self._importar('produtos'))
+        menu_arquivo.add_command(label="Importar Pedidos...", command=lambda: self._importar('pedidos'))
+        menu_arquivo.add_separator()
+        menu_arquivo.add_command(label="Exportar Pedidos...", command=lambda: self._exportar('pedidos'))
+        menu_arquivo.add_command(label="Exportar Relatório Financeiro...",
+                                 command=lambda: self._exportar('financeiro'))
+        barra.add_cascade(label="Arquivo", menu=menu_arquivo)
+        self.config(menu=barra)
+
+    def _importar(self, tipo):
+        arquivo = filedialog.askopenfilename(
+            title=f"Importar {tipo}",
+            filetypes=[("CSV ou JSON-lines", "*.csv *.jsonl *.json"), ("Todos os arquivos", "*.*")])
+        if not arquivo:
+            return
+
+        try:
+            if tipo == 'produtos':
+                quantidade = self.sistema.importacao.importar_produtos(arquivo)
+            else:
+                quantidade = self.sistema.importacao.importar_pedidos(arquivo)
+        except ErroValidacao as e:
+            messagebox.showerror("Erro", str(e))
+            return
+        except (OSError, UnicodeDecodeError, csv.Error) as e:
+            messagebox.showerror("Erro", f"Não foi possível ler o arquivo: {e}")
+            return
+
+        self._agendar_atualizacao('lista_produtos', 'comboboxes')
+        if tipo == 'pedidos':
+            self._agendar_atualizacao('lista_pedidos', 'lista_motoboys', 'financeiro')
+        messagebox.showinfo("Importação", f"{quantidade} {tipo} importado(s).")
+
+    def _exportar(self, tipo):
+        arquivo = filedialog.asksaveasfilename(
+            title="Exportar pedidos" if tipo == 'pedidos' else "Exportar relatório financeiro",
+            defaultextension='.xlsx',
+            filetypes=[("Planilha do Excel", "*.xlsx"), ("CSV", "*.csv")])
+        if not arquivo:
+            return
+
+        # Meses ainda não carregados são lidos pela própria thread da exportação
+        if tipo == 'pedidos':
+            linhas = self.sistema.exportacao.linhas_pedidos()
+        else:
+            linhas = self.sistema.exportacao.linhas_financeiro(*self._periodo_selecionado())
+        # A gravação segue em outra thread; a janela continua respondendo
+        exportacao = self.sistema.exportacao.exportar(linhas, arquivo)
+        self._exportacoes.append(exportacao)
+        self._acompanhar_exportacao(exportacao)
+
+    def _acompanhar_exportacao(self, exportacao):
+        if not exportacao.concluido:
+            self.after(200, self._acompanhar_exportacao, exportacao)
+            return
+        self._exportacoes.remove(exportacao)
+        if exportacao.erro:
+            messagebox.showerror("Erro", f"Falha ao exportar: {exportacao.erro}")
+        else:
+            messagebox.showinfo("Exportação", f"{exportacao.linhas} linha(s) gravada(s) em {exportacao.arquivo}.")
+
     def _criar_menu_contexto(self):
         self.menu_contexto = tk.Menu(self, tearoff=0)
         self.menu_contexto.add_command(label="Editar", command=self._editar_item_selecionado)
@@ -117,9 +236,39 @@ class App(tk.Tk):
                 self.menu_contexto.post(event.x_root, event.y_root)
 
     def _carregar_dados(self):
-        self.produtos = DataManager.carregar(DADOS['produtos'])
-        self.motoboys = DataManager.carregar(DADOS['motoboys'])
-        self.pedidos = DataManager.carregar(DADOS['pedidos'])
+        self.sistema = Sistema(PersistenceWorker(criar_backend(), ao_falhar=self._erro_persistencia),
+                               progressivo=True)
+        self.produtos = self.sistema.produtos
+        self.motoboys = self.sistema.motoboys
+        self.pedidos = self.sistema.pedidos
+        self._pagina_pedidos = 0
+        # Só os pedidos mais recentes antes de abrir a janela; os meses
+        # anteriores vêm conforme o período do Financeiro e a paginação pedem
+        self.sistema.carregar_proxima_parte()
+        self._garantir_pedidos(PEDIDOS_POR_PAGINA)
+
+    def _garantir_pedidos(self, quantidade):
+        # Lê meses anteriores até haver `quantidade` pedidos (ou acabar o histórico)
+        while len(self.pedidos) < quantidade and self.sistema.carregar_proxima_parte():
+            pass
+
+    def _carregar_periodo(self):
+        """Garante na memória os pedidos do período selecionado na aba Financeiro."""
+        periodo, inicio, fim = self._periodo_selecionado()
+        if not self.sistema.carregar_ate(intervalo_periodo(periodo, inicio=inicio, fim=fim)[0]):
+            # Período sem início (ou backend sem partições): o histórico inteiro
+            if not self._carregando_historico:
+                self._carregando_historico = True
+                self._carregar_historico()
+        self._agendar_atualizacao('lista_pedidos', 'lista_motoboys', 'financeiro')
+
+    def _carregar_historico(self):
+        # Um bloco por vez, devolvendo o controle ao Tk entre os blocos
+        if self.sistema.carregar_proxima_parte():
+            self.after(1, self._carregar_historico)
+        else:
+            self._carregando_historico = False
+        self._agendar_atualizacao('lista_pedidos', 'lista_motoboys', 'financeiro')
 
     def _criar_interface(self):
         self.abas = ttk.Notebook(self)
@@ -170,26 +319,16 @@ class App(tk.Tk):
 
         try:
             qtd, preco = int(qtd), float(preco)
-            if qtd < 0 or preco < 0:
-                raise ValueError
-        except:
+            self.sistema.servico_produtos.salvar(nome, qtd, preco)
+        except ErroValidacao as e:
+            messagebox.showerror("Erro", str(e))
+            return
+        except ValueError:
             messagebox.showerror("Erro", "Valores inválidos.")
             return
 
-        produto_atualizado = False
-        for p in self.produtos:
-            if p['nome'].lower() == nome.lower():
-                p.update({'quantidade': qtd, 'preco': preco})
-                produto_atualizado = True
-                break
-        
-        if not produto_atualizado:
-            self.produtos.append({'nome': nome, 'quantidade': qtd, 'preco': preco})
-
-        DataManager.salvar(DADOS['produtos'], self.produtos)
-        self._atualizar_lista_produtos()
         self._limpar_campos([self.entry_nome, self.entry_qtd, self.entry_preco])
-        self._atualizar_comboboxes()
+        self._agendar_atualizacao('lista_produtos', 'comboboxes')
 
     def _editar_item_selecionado(self):
         widget_focado = self.focus_get()
@@ -202,21 +341,19 @@ class App(tk.Tk):
             self._editar_motoboy()
 
     def _editar_produto(self):
-        selecionado = self.tree_produtos.selection()
-        if not selecionado:
+        selecionados = self._chaves_selecionadas(self.tree_produtos)
+        if not selecionados:
             return
-            
-        item = self.tree_produtos.item(selecionado)
-        nome = item['values'][0]
+        nome = selecionados[0]
         
-        produto = next((p for p in self.produtos if p['nome'] == nome), None)
+        produto = self.produtos.obter(nome)
         if produto:
             self.entry_nome.delete(0, tk.END)
-            self.entry_nome.insert(0, produto['nome'])
+            self.entry_nome.insert(0, produto.nome)
             self.entry_qtd.delete(0, tk.END)
-            self.entry_qtd.insert(0, str(produto['quantidade']))
+            self.entry_qtd.insert(0, str(produto.quantidade))
             self.entry_preco.delete(0, tk.END)
-            self.entry_preco.insert(0, str(produto['preco']))
+            self.entry_preco.insert(0, str(produto.preco))
 
     def _excluir_item_selecionado(self):
         widget_focado = self.focus_get()
@@ -239,99 +376,52 @@ class App(tk.Tk):
             self._excluir_motoboys_massa()
 
     def _excluir_produtos_massa(self):
-        selecionados = self.tree_produtos.selection()
-        if not selecionados:
+        nomes = self._chaves_selecionadas(self.tree_produtos)
+        if not nomes:
             return
-            
-        nomes = [self.tree_produtos.item(item)['values'][0] for item in selecionados]
         
         if messagebox.askyesno("Confirmar", f"Excluir {len(nomes)} produto(s) selecionado(s)?"):
-            self.produtos = [p for p in self.produtos if p['nome'] not in nomes]
-            DataManager.salvar(DADOS['produtos'], self.produtos)
-            self._atualizar_lista_produtos()
-            self._atualizar_comboboxes()
+            self.sistema.servico_produtos.excluir(nomes)
+            self._agendar_atualizacao('lista_produtos', 'comboboxes')
 
     def _excluir_pedidos_massa(self):
-        selecionados = self.tree_pedidos.selection()
-        if not selecionados:
+        pedidos_para_excluir = self._chaves_selecionadas(self.tree_pedidos)
+        if not pedidos_para_excluir:
             return
-            
-        pedidos_para_excluir = []
-        produtos_para_atualizar = {}
-        
-        for item in selecionados:
-            valores = self.tree_pedidos.item(item)['values']
-            pedido_id = valores[0]
-            produto_nome = valores[4]
-            quantidade = valores[5]
-            
-            pedidos_para_excluir.append(pedido_id)
-            
-            if produto_nome in produtos_para_atualizar:
-                produtos_para_atualizar[produto_nome] += quantidade
-            else:
-                produtos_para_atualizar[produto_nome] = quantidade
         
         if not messagebox.askyesno("Confirmar", f"Excluir {len(pedidos_para_excluir)} pedido(s) selecionado(s)?"):
             return
         
-        for produto_nome, quantidade in produtos_para_atualizar.items():
-            produto = next((p for p in self.produtos if p['nome'] == produto_nome), None)
-            if produto:
-                produto['quantidade'] += quantidade
-        
-        self.pedidos = [p for p in self.pedidos if p.get('id') not in pedidos_para_excluir]
-        
-        DataManager.salvar(DADOS['produtos'], self.produtos)
-        DataManager.salvar(DADOS['pedidos'], self.pedidos)
-        self._atualizar_lista_pedidos()
-        self._atualizar_lista_produtos()
+        self.sistema.servico_pedidos.excluir(pedidos_para_excluir)
+        self._agendar_atualizacao('lista_pedidos', 'lista_produtos', 'lista_motoboys', 'comboboxes', 'financeiro')
 
     def _excluir_motoboys_massa(self):
-        selecionados = self.tree_motoboys.selection()
-        if not selecionados:
+        nomes = self._chaves_selecionadas(self.tree_motoboys)
+        if not nomes:
             return
-            
-        nomes = [self.tree_motoboys.item(item)['values'][0] for item in selecionados]
-        
-        motoboys_em_uso = []
-        for nome in nomes:
-            if any(p['motoboy'] == nome for p in self.pedidos):
-                motoboys_em_uso.append(nome)
         
-        if motoboys_em_uso:
-            messagebox.showerror("Erro", 
-                f"Os seguintes motoboys estão em pedidos e não podem ser excluídos: {', '.join(motoboys_em_uso)}")
-            return
-            
         if messagebox.askyesno("Confirmar", f"Excluir {len(nomes)} motoboy(s) selecionado(s)?"):
-            self.motoboys = [m for m in self.motoboys if m['nome'] not in nomes]
-            DataManager.salvar(DADOS['motoboys'], self.motoboys)
-            self._atualizar_lista_motoboys()
-            self._atualizar_comboboxes()
+            self._excluir_motoboys(nomes)
 
     def _excluir_produto(self):
-        selecionado = self.tree_produtos.selection()
-        if not selecionado:
+        selecionados = self._chaves_selecionadas(self.tree_produtos)
+        if not selecionados:
             return
-            
-        item = self.tree_produtos.item(selecionado)
-        nome = item['values'][0]
+        nome = selecionados[0]
         
         if messagebox.askyesno("Confirmar", f"Excluir o produto '{nome}'?"):
-            self.produtos = [p for p in self.produtos if p['nome'] != nome]
-            DataManager.salvar(DADOS['produtos'], self.produtos)
-            self._atualizar_lista_produtos()
-            self._atualizar_comboboxes()
+            self.sistema.servico_produtos.excluir([nome])
+            self._agendar_atualizacao('lista_produtos', 'comboboxes')
 
     def _atualizar_lista_produtos(self):
-        self._limpar_treeview(self.tree_produtos)
-        for p in sorted(self.produtos, key=lambda x: x['nome']):
-            self.tree_produtos.insert("", "end", values=(
-                p['nome'], 
-                p['quantidade'], 
-                f"{p['preco']:.2f}"
+        self._sincronizar_treeview(self.tree_produtos, [
+            (p.nome, (
+                p.nome, 
+                p.quantidade, 
+                f"{p.preco:.2f}"
             ))
+            for p in sorted(self.produtos, key=lambda x: x.nome)
+        ])
 
     def _criar_aba_motoboys(self):
         frame = ttk.Frame(self.abas, padding=10)
@@ -348,10 +438,11 @@ class App(tk.Tk):
         ttk.Button(frame, text="Adicionar/Atualizar", 
                  command=self._adicionar_motoboy).grid(row=2, column=0, columnspan=2, pady=10, sticky="ew")
 
-        self.tree_motoboys = ttk.Treeview(frame, columns=("Nome", "Valor"), show="headings", height=12)
-        for col, width in [("Nome", 300), ("Valor", 150)]:
+        self.tree_motoboys = ttk.Treeview(frame, columns=("Nome", "Valor", "Entregas Hoje"),
+                                          show="headings", height=12)
+        for col, width in [("Nome", 300), ("Valor", 150), ("Entregas Hoje", 120)]:
             self.tree_motoboys.heading(col, text=col)
-            self.tree_motoboys.column(col, width=width, anchor='center' if col == "Valor" else 'w')
+            self.tree_motoboys.column(col, width=width, anchor='w' if col == "Nome" else 'center')
         
         self.tree_motoboys.grid(row=3, column=0, columnspan=2, pady=10, sticky="nsew")
         self._atualizar_lista_motoboys()
@@ -360,39 +451,35 @@ class App(tk.Tk):
         frame.rowconfigure(3, weight=1)
 
     def _editar_motoboy(self):
-        selecionado = self.tree_motoboys.selection()
-        if not selecionado:
+        selecionados = self._chaves_selecionadas(self.tree_motoboys)
+        if not selecionados:
             return
-            
-        item = self.tree_motoboys.item(selecionado)
-        nome = item['values'][0]
+        nome = selecionados[0]
         
-        motoboy = next((m for m in self.motoboys if m['nome'] == nome), None)
+        motoboy = self.motoboys.obter(nome)
         if motoboy:
             self.entry_motoboy_nome.delete(0, tk.END)
-            self.entry_motoboy_nome.insert(0, motoboy['nome'])
+            self.entry_motoboy_nome.insert(0, motoboy.nome)
             self.entry_motoboy_valor.delete(0, tk.END)
-            self.entry_motoboy_valor.insert(0, str(motoboy['valor_por_entrega']))
+            self.entry_motoboy_valor.insert(0, str(motoboy.valor_por_entrega))
 
     def _excluir_motoboy(self):
-        selecionado = self.tree_motoboys.selection()
-        if not selecionado:
+        selecionados = self._chaves_selecionadas(self.tree_motoboys)
+        if not selecionados:
             return
-            
-        item = self.tree_motoboys.item(selecionado)
-        nome = item['values'][0]
-        
-        usado_em_pedidos = any(p['motoboy'] == nome for p in self.pedidos)
+        nome = selecionados[0]
         
-        if usado_em_pedidos:
-            messagebox.showerror("Erro", "Este motoboy está associado a pedidos e não pode ser excluído.")
-            return
-            
         if messagebox.askyesno("Confirmar", f"Excluir o motoboy '{nome}'?"):
-            self.motoboys = [m for m in self.motoboys if m['nome'] != nome]
-            DataManager.salvar(DADOS['motoboys'], self.motoboys)
-            self._atualizar_lista_motoboys()
-            self._atualizar_comboboxes()
+            self._excluir_motoboys([nome])
+
+    def _excluir_motoboys(self, nomes):
+        # O serviço recusa motoboys com pedidos, inclusive de meses ainda não carregados
+        try:
+            self.sistema.servico_motoboys.excluir(nomes)
+        except ErroValidacao as e:
+            messagebox.showerror("Erro", str(e))
+            return
+        self._agendar_atualizacao('lista_motoboys', 'comboboxes', 'financeiro')
 
     def _adicionar_motoboy(self):
         nome = self.entry_motoboy_nome.get().strip()
@@ -403,35 +490,27 @@ class App(tk.Tk):
             return
 
         try:
-            valor = float(valor)
-            if valor < 0:
-                raise ValueError
-        except:
+            self.sistema.servico_motoboys.salvar(nome, float(valor))
+        except ErroValidacao as e:
+            messagebox.showerror("Erro", str(e))
+            return
+        except ValueError:
             messagebox.showerror("Erro", "Valor inválido.")
             return
 
-        motoboy_atualizado = False
-        for m in self.motoboys:
-            if m['nome'].lower() == nome.lower():
-                m['valor_por_entrega'] = valor
-                motoboy_atualizado = True
-                break
-        
-        if not motoboy_atualizado:
-            self.motoboys.append({'nome': nome, 'valor_por_entrega': valor})
-
-        DataManager.salvar(DADOS['motoboys'], self.motoboys)
-        self._atualizar_lista_motoboys()
         self._limpar_campos([self.entry_motoboy_nome, self.entry_motoboy_valor])
-        self._atualizar_comboboxes()
+        self._agendar_atualizacao('lista_motoboys', 'comboboxes', 'financeiro')
 
     def _atualizar_lista_motoboys(self):
-        self._limpar_treeview(self.tree_motoboys)
-        for m in sorted(self.motoboys, key=lambda x: x['nome']):
-            self.tree_motoboys.insert("", "end", values=(
-                m['nome'], 
-                f"{m['valor_por_entrega']:.2f}"
+        hoje = intervalo_periodo('Hoje')
+        self._sincronizar_treeview(self.tree_motoboys, [
+            (m.nome, (
+                m.nome, 
+                f"{m.valor_por_entrega:.2f}",
+                self.sistema.servico_pedidos.entregas(m.nome, *hoje)
             ))
+            for m in sorted(self.motoboys, key=lambda x: x.nome)
+        ])
             
             
     def _criar_aba_pedidos(self):
@@ -449,23 +528,45 @@ class App(tk.Tk):
         self.entry_cliente.grid(row=0, column=1, pady=5, sticky="ew")
 
         ttk.Label(frame, text="Tipo do Pedido:").grid(row=1, column=0, sticky="w", pady=5)
-        self.combo_tipo = ttk.Combobox(frame, values=['Loja', 'iFood', 'Robô'], 
+        self.combo_tipo = ttk.Combobox(frame, values=TIPOS_PEDIDO, 
                                     state="readonly", width=27, style='Dark.TCombobox')
         self.combo_tipo.current(0)
         self.combo_tipo.grid(row=1, column=1, pady=5, sticky="ew")
         self.combo_tipo.bind('<<ComboboxSelected>>', self._atualizar_visibilidade_motoboy)
 
         ttk.Label(frame, text="Produto:").grid(row=2, column=0, sticky="w", pady=5)
-        self.combo_produto = ttk.Combobox(frame, state="readonly", width=27, style='Dark.TCombobox')
+        # Campo com busca: a lista mostra só os produtos que combinam com o texto digitado
+        self.combo_produto = ttk.Combobox(frame, width=27, style='Dark.TCombobox')
         self.combo_produto.grid(row=2, column=1, pady=5, sticky="ew")
+        self.combo_produto.bind('<KeyRelease>', self._filtrar_produtos)
+        self.combo_produto.bind('<<ComboboxSelected>>', self._escolher_produto)
+        self._opcoes_produto = {}
+        self.lbl_produto_info = ttk.Label(frame, text="")
+        self.lbl_produto_info.grid(row=2, column=2, sticky="w", padx=5)
 
         ttk.Label(frame, text="Quantidade:").grid(row=3, column=0, sticky="w", pady=5)
         self.entry_pedido_qtd = ttk.Entry(frame, width=30, style='Dark.TEntry')
         self.entry_pedido_qtd.grid(row=3, column=1, pady=5, sticky="ew")
 
+        # Itens do pedido em montagem (vazio = pedido de um produto só, o do formulário)
+        self._itens_pedido = []
+        botoes_itens = ttk.Frame(frame)
+        botoes_itens.grid(row=4, column=0, columnspan=2, sticky="ew")
+        ttk.Button(botoes_itens, text="Adicionar Item",
+                command=self._adicionar_item_pedido).pack(side='left', expand=True, fill='x', padx=(0, 5))
+        ttk.Button(botoes_itens, text="Remover Item",
+                command=self._remover_item_pedido).pack(side='left', expand=True, fill='x')
+
+        self.tree_itens_pedido = ttk.Treeview(frame, columns=("Produto", "Qtd"), show="headings", height=3)
+        self.tree_itens_pedido.heading("Produto", text="Produto")
+        self.tree_itens_pedido.heading("Qtd", text="Qtd")
+        self.tree_itens_pedido.column("Produto", width=250, anchor='w')
+        self.tree_itens_pedido.column("Qtd", width=60, anchor='center')
+        self.tree_itens_pedido.grid(row=5, column=0, columnspan=2, pady=5, sticky="ew")
+
         # Frame para motoboy (pode ser escondido)
         self.motoboy_frame = ttk.Frame(frame)
-        self.motoboy_frame.grid(row=4, column=0, columnspan=2, sticky="ew")
+        self.motoboy_frame.grid(row=6, column=0, columnspan=2, sticky="ew")
         
         ttk.Label(self.motoboy_frame, text="Motoboy:").grid(row=0, column=0, sticky="w", pady=5)
         self.combo_motoboy = ttk.Combobox(self.motoboy_frame, state="readonly", 
@@ -473,7 +574,7 @@ class App(tk.Tk):
         self.combo_motoboy.grid(row=0, column=1, pady=5, sticky="ew")
 
         ttk.Button(frame, text="Adicionar Pedido", 
-                command=self._adicionar_pedido).grid(row=5, column=0, columnspan=2, pady=10, sticky="ew")
+                command=self._adicionar_pedido).grid(row=7, column=0, columnspan=2, pady=10, sticky="ew")
 
         # Lista de pedidos
         cols = [("ID", 50), ("Cliente", 150), ("Data", 120), ("Tipo", 80), 
@@ -484,77 +585,77 @@ class App(tk.Tk):
             self.tree_pedidos.heading(col, text=col)
             self.tree_pedidos.column(col, width=width, anchor='center' if col not in ["Cliente", "Produto", "Motoboy"] else 'w')
         
-        self.tree_pedidos.grid(row=6, column=0, columnspan=2, pady=10, sticky="nsew")
+        self.tree_pedidos.grid(row=8, column=0, columnspan=2, pady=10, sticky="nsew")
+
+        # Paginação
+        paginacao = ttk.Frame(frame)
+        paginacao.grid(row=9, column=0, columnspan=2, sticky="ew")
+        ttk.Button(paginacao, text="◀ Anterior",
+                command=lambda: self._mudar_pagina_pedidos(-1)).pack(side='left')
+        ttk.Button(paginacao, text="Próxima ▶",
+                command=lambda: self._mudar_pagina_pedidos(1)).pack(side='right')
+        ttk.Label(paginacao, text="Motoboy:").pack(side='left', padx=(10, 5))
+        self.combo_filtro_motoboy = ttk.Combobox(paginacao, values=[TODOS_MOTOBOYS], state="readonly",
+                                                 width=20, style='Dark.TCombobox')
+        self.combo_filtro_motoboy.current(0)
+        self.combo_filtro_motoboy.pack(side='left')
+        self.combo_filtro_motoboy.bind('<<ComboboxSelected>>', self._filtrar_motoboy)
+        self.lbl_pagina_pedidos = ttk.Label(paginacao, text="", anchor='center')
+        self.lbl_pagina_pedidos.pack(side='left', fill='x', expand=True)
+
         self._atualizar_lista_pedidos()
 
         self._atualizar_comboboxes()
 
         frame.columnconfigure(1, weight=1)
-        frame.rowconfigure(6, weight=1)
+        frame.rowconfigure(8, weight=1)
      
     def _editar_pedido(self):
-        selecionado = self.tree_pedidos.selection()
-        if not selecionado:
+        selecionados = self._chaves_selecionadas(self.tree_pedidos)
+        if not selecionados:
             return
-            
-        item = self.tree_pedidos.item(selecionado)
-        pedido_id = item['values'][0]
+        pedido_id = selecionados[0]
         
-        pedido = next((p for p in self.pedidos if p.get('id') == pedido_id), None)
-        if pedido:
-            # Devolve o estoque
-            produto = next((p for p in self.produtos if p['nome'] == pedido['produto']), None)
-            if produto:
-                produto['quantidade'] += pedido['quantidade']
-                DataManager.salvar(DADOS['produtos'], self.produtos)
+        # Remove o pedido antigo devolvendo o estoque; o formulário o recria
+        removidos = self.sistema.servico_pedidos.excluir([pedido_id])
+        if removidos:
+            pedido = removidos[0]
             
             # Preenche o formulário
             self.entry_cliente.delete(0, tk.END)
-            self.entry_cliente.insert(0, pedido.get('cliente', ''))
-            self.combo_tipo.set(pedido['tipo'])
-            self.combo_produto.set(pedido['produto'])
+            self.entry_cliente.insert(0, pedido.cliente)
+            self.combo_tipo.set(pedido.tipo)
             self.entry_pedido_qtd.delete(0, tk.END)
-            self.entry_pedido_qtd.insert(0, str(pedido['quantidade']))
-            
-            if pedido['tipo'] in ['iFood', 'Robô']:
-                self.combo_motoboy.set(pedido['motoboy'])
+            if len(pedido.itens) == 1:
+                self._itens_pedido = []
+                self.combo_produto.set(pedido.itens[0].produto)
+                self._mostrar_produto()
+                self.entry_pedido_qtd.insert(0, str(pedido.itens[0].quantidade))
+            else:
+                self._itens_pedido = [(i.produto, i.quantidade) for i in pedido.itens]
+            self._atualizar_itens_pedido()
             
-            # Remove o pedido antigo
-            self.pedidos = [p for p in self.pedidos if p.get('id') != pedido_id]
-            DataManager.salvar(DADOS['pedidos'], self.pedidos)
+            if pedido.tipo in ['iFood', 'Robô']:
+                self.combo_motoboy.set(pedido.motoboy)
             
             # Atualiza as listas
-            self._atualizar_lista_pedidos()
-            self._atualizar_lista_produtos()
+            self._agendar_atualizacao('lista_pedidos', 'lista_produtos', 'lista_motoboys', 'comboboxes', 'financeiro')
 
     def _excluir_pedido(self):
-        selecionado = self.tree_pedidos.selection()
-        if not selecionado:
+        selecionados = self._chaves_selecionadas(self.tree_pedidos)
+        if not selecionados:
             return
-            
-        item = self.tree_pedidos.item(selecionado)
-        pedido_id = item['values'][0]
-        produto_nome = item['values'][4]
-        quantidade = int(item['values'][5])
+        pedido_id = selecionados[0]
         
-        pedido = next((p for p in self.pedidos if p.get('id') == pedido_id), None)
-        if not pedido:
+        if pedido_id not in self.pedidos:
             return
             
         if messagebox.askyesno("Confirmar", f"Excluir este pedido?"):
-            # Devolve o estoque
-            produto = next((p for p in self.produtos if p['nome'] == produto_nome), None)
-            if produto:
-                produto['quantidade'] += quantidade
-                DataManager.salvar(DADOS['produtos'], self.produtos)
-            
-            # Remove o pedido
-            self.pedidos = [p for p in self.pedidos if p.get('id') != pedido_id]
-            DataManager.salvar(DADOS['pedidos'], self.pedidos)
+            # Remove o pedido devolvendo o estoque
+            self.sistema.servico_pedidos.excluir([pedido_id])
             
             # Atualiza as listas
-            self._atualizar_lista_pedidos()
-            self._atualizar_lista_produtos()
+            self._agendar_atualizacao('lista_pedidos', 'lista_produtos', 'lista_motoboys', 'comboboxes', 'financeiro')
 
     def _atualizar_visibilidade_motoboy(self, event=None):
         tipo = self.combo_tipo.get()
@@ -563,94 +664,148 @@ class App(tk.Tk):
         else:
             self.motoboy_frame.grid()
 
-    def _adicionar_pedido(self):
-        cliente = self.entry_cliente.get().strip()
-        tipo = self.combo_tipo.get()
-        produto = self.combo_produto.get()
-        qtd_str = self.entry_pedido_qtd.get().strip()
-        
-        # Motoboy só é obrigatório para iFood e Robô
-        motoboy = self.combo_motoboy.get() if tipo in ['iFood', 'Robô'] else None
-        if tipo in ['iFood', 'Robô'] and not motoboy:
-            messagebox.showerror("Erro", "Selecione um motoboy para este tipo de pedido.")
-            return
-
-        if not all([cliente, produto, qtd_str]):
-            messagebox.showerror("Erro", "Preencha todos os campos obrigatórios.")
+    def _filtrar_produtos(self, event=None):
+        # Setas, Enter etc. navegam na lista já exibida
+        if event is not None and event.keysym in ('Up', 'Down', 'Return', 'Escape', 'Tab'):
             return
-
+        produtos = self.sistema.servico_produtos.buscar(self.combo_produto.get(), SUGESTOES_PRODUTO)
+        self._opcoes_produto = {
+            f"{p.nome}  ·  estoque {p.quantidade}  ·  R$ {p.preco:.2f}": p.nome for p in produtos
+        }
+        self.combo_produto['values'] = list(self._opcoes_produto)
+        self._mostrar_produto()
+
+    def _escolher_produto(self, event=None):
+        # A lista traz estoque e preço; no campo fica só o nome
+        rotulo = self.combo_produto.get()
+        self.combo_produto.set(self._opcoes_produto.get(rotulo, rotulo))
+        self._mostrar_produto()
+
+    def _mostrar_produto(self):
+        produto = self.produtos.obter_casefold(self.combo_produto.get().strip())
+        self.lbl_produto_info.config(
+            text=f"Estoque: {produto.quantidade} | R$ {produto.preco:.2f}" if produto else "")
+
+    def _produto_digitado(self):
+        """Nome cadastrado correspondente ao texto do campo Produto (sem caixa)."""
+        texto = self.combo_produto.get().strip()
+        produto = self.produtos.obter_casefold(texto)
+        return produto.nome if produto else texto
+
+    def _adicionar_item_pedido(self):
+        produto = self._produto_digitado()
+        qtd_str = self.entry_pedido_qtd.get().strip()
         try:
-            qtd = int(qtd_str)
-            if qtd <= 0:
-                raise ValueError
-        except:
+            qtd = int(qtd_str) if qtd_str else 0
+        except ValueError:
             messagebox.showerror("Erro", "Quantidade inválida.")
             return
-
-        # Busca produto
-        produto_obj = next((p for p in self.produtos if p['nome'] == produto), None)
-        if not produto_obj:
-            messagebox.showerror("Erro", "Produto não encontrado.")
-            return
-            
-        # Verifica estoque
-        if produto_obj['quantidade'] < qtd:
-            messagebox.showerror("Erro", f"Estoque insuficiente. Disponível: {produto_obj['quantidade']}")
+        if not produto or qtd <= 0:
+            messagebox.showerror("Erro", "Selecione o produto e informe uma quantidade válida.")
             return
 
-        # Busca motoboy se necessário
-        motoboy_obj = None
-        if motoboy:
-            motoboy_obj = next((m for m in self.motoboys if m['nome'] == motoboy), None)
-            if not motoboy_obj:
-                messagebox.showerror("Erro", "Motoboy não encontrado.")
-                return
+        self._itens_pedido.append((produto, qtd))
+        self._atualizar_itens_pedido()
+        self._limpar_campos([self.entry_pedido_qtd])
 
-        # Calcula preço (com taxa para iFood)
-        preco = produto_obj['preco']
-        if tipo == 'iFood':
-            preco = round(preco * (1 + PERCENTUAL_IFOOD), 2)
-
-        # Atualiza estoque
-        produto_obj['quantidade'] -= qtd
-        DataManager.salvar(DADOS['produtos'], self.produtos)
-
-        # Gera ID único para o pedido
-        pedido_id = max([p.get('id', 0) for p in self.pedidos] + [0]) + 1
-
-        # Cria pedido
-        pedido = {
-            'id': pedido_id,
-            'cliente': cliente,
-            'data': datetime.now().strftime("%d/%m/%Y %H:%M"),
-            'tipo': tipo,
-            'produto': produto,
-            'quantidade': qtd,
-            'preco_unitario': preco,
-            'motoboy': motoboy if motoboy else "Retirada na Loja",
-            'total': preco * qtd
-        }
+    def _remover_item_pedido(self):
+        posicoes = sorted(self._chaves_selecionadas(self.tree_itens_pedido), reverse=True)
+        for posicao in posicoes:
+            del self._itens_pedido[posicao]
+        self._atualizar_itens_pedido()
 
-        self.pedidos.append(pedido)
-        DataManager.salvar(DADOS['pedidos'], self.pedidos)
-        self._atualizar_lista_pedidos()
-        self._atualizar_lista_produtos()
+    def _atualizar_itens_pedido(self):
+        self._sincronizar_treeview(self.tree_itens_pedido, list(enumerate(self._itens_pedido)))
+
+    def _adicionar_pedido(self):
+        cliente = self.entry_cliente.get().strip()
+        tipo = self.combo_tipo.get()
+        motoboy = self.combo_motoboy.get()
+
+        try:
+            itens = self._itens_pedido
+            if not itens:
+                qtd_str = self.entry_pedido_qtd.get().strip()
+                itens = [(self._produto_digitado(), int(qtd_str) if qtd_str else 0)]
+            self.sistema.servico_pedidos.criar(cliente, tipo, itens, motoboy)
+        except ErroValidacao as e:
+            messagebox.showerror("Erro", str(e))
+            return
+        except ValueError:
+            messagebox.showerror("Erro", "Quantidade inválida.")
+            return
+
+        self._itens_pedido = []
+        self._atualizar_itens_pedido()
         self._limpar_campos([self.entry_cliente, self.entry_pedido_qtd])
+        self._agendar_atualizacao('lista_pedidos', 'lista_produtos', 'lista_motoboys', 'comboboxes', 'financeiro')
+
+    def _mudar_pagina_pedidos(self, deslocamento):
+        self._pagina_pedidos += deslocamento
+        self._garantir_pagina_pedidos()
+        self._agendar_atualizacao('lista_pedidos')
+
+    def _filtrar_motoboy(self, event=None):
+        self._pagina_pedidos = 0
+        self._garantir_pagina_pedidos()
+        self._agendar_atualizacao('lista_pedidos')
+
+    def _garantir_pagina_pedidos(self):
+        quantidade = (self._pagina_pedidos + 1) * PEDIDOS_POR_PAGINA
+        motoboy = self.combo_filtro_motoboy.get()
+        if motoboy in self.motoboys:
+            # Só os meses até completar a página; o manifesto diz onde há pedidos dele
+            self.sistema.carregar_do_motoboy(motoboy, quantidade)
+        else:
+            self._garantir_pedidos(quantidade)
 
     def _atualizar_lista_pedidos(self):
-        self._limpar_treeview(self.tree_pedidos)
-        for p in sorted(self.pedidos, key=lambda x: x.get('id', 0), reverse=True):
-            self.tree_pedidos.insert("", "end", values=(
-                p.get('id', ''),
-                p.get('cliente', ''),
-                p['data'],
-                p['tipo'],
-                p['produto'],
-                p['quantidade'],
-                f"{p['preco_unitario']:.2f}",
-                p['motoboy'],
-                f"{p['total']:.2f}"
+        # Mais recentes primeiro; só a página atual vira linhas na Treeview
+        motoboy = self.combo_filtro_motoboy.get()
+        if motoboy in self.motoboys:
+            # Pedidos do motoboy, pelo índice reverso; os dos meses ainda não
+            # carregados entram no total pelas contagens do backend
+            ids = self.sistema.servico_pedidos.ids_do_motoboy(motoboy)
+            total = len(ids)
+            if self.sistema.carregando:
+                total += self.sistema.backend.motoboys_nao_carregados().get(motoboy, 0)
+        else:
+            total = len(self.pedidos)
+        total_paginas = max((total - 1) // PEDIDOS_POR_PAGINA + 1, 1)
+        self._pagina_pedidos = min(max(self._pagina_pedidos, 0), total_paginas - 1)
+        if motoboy in self.motoboys:
+            fim = max(len(ids) - self._pagina_pedidos * PEDIDOS_POR_PAGINA, 0)
+            pagina = [self.pedidos.obter(i) for i in reversed(ids[max(fim - PEDIDOS_POR_PAGINA, 0):fim])]
+        else:
+            pagina = self.pedidos.fatia(self._pagina_pedidos * PEDIDOS_POR_PAGINA,
+                                        PEDIDOS_POR_PAGINA, decrescente=True)
+        texto = f"Página {self._pagina_pedidos + 1} de {total_paginas} ({total} pedidos)"
+        if self._carregando_historico:
+            texto += " - carregando histórico..."
+        elif self.sistema.carregando:
+            texto += " - meses anteriores são carregados ao avançar as páginas"
+        self.lbl_pagina_pedidos.config(text=texto)
+
+        self._sincronizar_treeview(self.tree_pedidos, [
+            (p.id, (
+                '' if p.id is None else p.id,
+                p.cliente,
+                p.data,
+                p.tipo,
+                self._descricao_itens(p),
+                p.quantidade,
+                f"{p.itens[0].preco_unitario:.2f}" if len(p.itens) == 1 else "",
+                p.motoboy,
+                f"{p.total:.2f}"
             ))
+            for p in pagina
+        ])
+
+    @staticmethod
+    def _descricao_itens(pedido):
+        if len(pedido.itens) == 1:
+            return pedido.itens[0].produto
+        return ", ".join(f"{i.quantidade}x {i.produto}" for i in pedido.itens)
 
     def _criar_aba_financeiro(self):
         frame = ttk.Frame(self.abas, padding=20)
@@ -658,6 +813,24 @@ class App(tk.Tk):
 
         ttk.Label(frame, text="Resumo Financeiro", font=('Segoe UI', 12, 'bold')).pack(pady=10)
 
+        # Filtro de período
+        filtro = ttk.Frame(frame)
+        filtro.pack(pady=5)
+        ttk.Label(filtro, text="Período:").pack(side='left', padx=5)
+        self.combo_periodo = ttk.Combobox(filtro, values=PERIODOS, state="readonly",
+                                          width=15, style='Dark.TCombobox')
+        # O mês corrente não exige ler o histórico inteiro ao abrir a janela
+        self.combo_periodo.set('Mês')
+        self.combo_periodo.pack(side='left', padx=5)
+        self.combo_periodo.bind('<<ComboboxSelected>>', lambda e: self._carregar_periodo())
+        ttk.Label(filtro, text="De:").pack(side='left', padx=5)
+        self.entry_periodo_inicio = ttk.Entry(filtro, width=12, style='Dark.TEntry')
+        self.entry_periodo_inicio.pack(side='left')
+        ttk.Label(filtro, text="Até:").pack(side='left', padx=5)
+        self.entry_periodo_fim = ttk.Entry(filtro, width=12, style='Dark.TEntry')
+        self.entry_periodo_fim.pack(side='left')
+        ttk.Button(filtro, text="Filtrar", command=self._filtrar_periodo).pack(side='left', padx=5)
+
         self.lbl_vendas = ttk.Label(frame, text="Total Vendas: R$ 0.00", font=FONT)
         self.lbl_vendas.pack(pady=5)
 
@@ -667,33 +840,140 @@ class App(tk.Tk):
         self.lbl_lucro = ttk.Label(frame, text="Lucro Líquido: R$ 0.00", font=('Segoe UI', 12, 'bold'))
         self.lbl_lucro.pack(pady=15)
 
-        ttk.Button(frame, text="Calcular", command=self._calcular_financeiro).pack(pady=10)
+        detalhes = ttk.Frame(frame)
+        detalhes.pack(fill='both', expand=True)
 
-    def _calcular_financeiro(self):
-        total_vendas = sum(p['total'] for p in self.pedidos)
-        
-        total_motoboys = 0
-        for p in self.pedidos:
-            if p['tipo'] != 'Loja':
-                motoboy = next((m for m in self.motoboys if m['nome'] == p['motoboy']), None)
-                if motoboy:
-                    total_motoboys += motoboy['valor_por_entrega']
+        self.tree_financeiro_canais = ttk.Treeview(detalhes, columns=("Canal", "Pedidos", "Vendas", "Motoboys"),
+                                                   show="headings", height=4)
+        for col, width in [("Canal", 100), ("Pedidos", 80), ("Vendas", 100), ("Motoboys", 100)]:
+            self.tree_financeiro_canais.heading(col, text=col)
+            self.tree_financeiro_canais.column(col, width=width, anchor='center' if col != "Canal" else 'w')
+        self.tree_financeiro_canais.pack(side='left', fill='both', expand=True, padx=5)
+
+        self.tree_financeiro_motoboys = ttk.Treeview(detalhes, columns=("Motoboy", "Entregas", "Custo"),
+                                                     show="headings", height=4)
+        for col, width in [("Motoboy", 150), ("Entregas", 80), ("Custo", 100)]:
+            self.tree_financeiro_motoboys.heading(col, text=col)
+            self.tree_financeiro_motoboys.column(col, width=width, anchor='center' if col != "Motoboy" else 'w')
+        self.tree_financeiro_motoboys.pack(side='left', fill='both', expand=True, padx=5)
+
+        ttk.Button(frame, text="Recalcular", command=self._calcular_financeiro).pack(pady=10)
+        self._atualizar_financeiro()
+
+    def _filtrar_periodo(self):
+        try:
+            self._datas_personalizadas()
+        except ValueError:
+            messagebox.showerror("Erro", "Datas inválidas. Use o formato dd/mm/aaaa.")
+            return
+        self.combo_periodo.set('Personalizado')
+        self._carregar_periodo()
 
-        lucro = total_vendas - total_motoboys
+    def _datas_personalizadas(self):
+        inicio, fim = self.entry_periodo_inicio.get().strip(), self.entry_periodo_fim.get().strip()
+        return (datetime.strptime(inicio, "%d/%m/%Y") if inicio else None,
+                datetime.strptime(fim, "%d/%m/%Y") if fim else None)
 
-        self.lbl_vendas.config(text=f"Total Vendas: R$ {total_vendas:.2f}")
-        self.lbl_motoboys.config(text=f"Total Motoboys: R$ {total_motoboys:.2f}")
-        self.lbl_lucro.config(text=f"Lucro Líquido: R$ {lucro:.2f}")
+    def _periodo_selecionado(self):
+        try:
+            inicio, fim = self._datas_personalizadas()
+        except ValueError:
+            inicio = fim = None
+        return self.combo_periodo.get(), inicio, fim
+
+    def _resumo_do_periodo(self):
+        return self.sistema.financas.resumo_periodo(*self._periodo_selecionado())
+
+    def _atualizar_financeiro(self):
+        f = self._resumo_do_periodo()
+        self.lbl_vendas.config(text=f"Total Vendas: R$ {f.total_vendas:.2f}")
+        self.lbl_motoboys.config(text=f"Total Motoboys: R$ {f.total_motoboys:.2f}")
+        self.lbl_lucro.config(text=f"Lucro Líquido: R$ {f.lucro:.2f}")
+
+        self._sincronizar_treeview(self.tree_financeiro_canais, [
+            (canal, (
+                canal,
+                f.pedidos_por_canal.get(canal, 0),
+                f"{f.vendas_por_canal.get(canal, 0):.2f}",
+                f"{f.custo_por_canal.get(canal, 0):.2f}"
+            ))
+            for canal in TIPOS_PEDIDO
+        ])
+        self._sincronizar_treeview(self.tree_financeiro_motoboys, [
+            (nome, (nome, entregas, f"{entregas * f.valores.get(nome, 0):.2f}"))
+            for nome, entregas in sorted(f.entregas_por_motoboy().items())
+        ])
+
+    def _calcular_financeiro(self):
+        """Recalcula tudo a partir dos pedidos e confere com os totais mantidos."""
+        if self.sistema.financas.recalcular():
+            messagebox.showwarning("Aviso", "Os totais acumulados divergiam do recálculo e foram corrigidos.")
+        self._agendar_atualizacao('financeiro')
 
     def _atualizar_comboboxes(self):
-        self.combo_produto['values'] = [p['nome'] for p in self.produtos]
-        self.combo_motoboy['values'] = [m['nome'] for m in self.motoboys]
-        if self.produtos: self.combo_produto.current(0)
-        if self.motoboys: self.combo_motoboy.current(0)
-
-    def _limpar_treeview(self, tree):
-        for item in tree.get_children():
-            tree.delete(item)
+        # Preserva a escolha atual se o registro ainda existe
+        if not self.produtos:
+            self.combo_produto.set('')
+        elif not self.produtos.obter(self._produto_digitado()):
+            self.combo_produto.set(self.sistema.servico_produtos.buscar('', 1)[0].nome)
+        # Estoque e preço da lista de sugestões podem ter mudado
+        self._filtrar_produtos()
+
+        # Só reenvia a lista de motoboys ao Tk quando ela mudou
+        nomes = [m.nome for m in self.motoboys]
+        if self._valores_motoboys != nomes:
+            self.combo_motoboy['values'] = nomes
+            self.combo_filtro_motoboy['values'] = [TODOS_MOTOBOYS] + nomes
+            self._valores_motoboys = nomes
+        if self.combo_filtro_motoboy.get() not in self.motoboys:
+            self.combo_filtro_motoboy.current(0)
+        if not nomes:
+            self.combo_motoboy.set('')
+        elif not self.motoboys.obter(self.combo_motoboy.get()):
+            self.combo_motoboy.current(0)
+
+    def _sincronizar_treeview(self, tree, linhas):
+        """Aplica na Treeview apenas as diferenças desde a última atualização.
+
+        `linhas` é a lista ordenada de (chave, valores) que deve ser exibida;
+        linhas inalteradas não geram nenhuma chamada ao Tk.
+        """
+        anteriores = self._linhas_treeview.get(tree, {})
+        novas = dict(linhas)
+
+        removidas = [iid for chave, (iid, _) in anteriores.items() if chave not in novas]
+        if removidas:
+            tree.delete(*removidas)
+
+        # As chaves que continuam na lista mantêm a ordem relativa? Então basta
+        # inserir as novas na posição certa; caso contrário, reposiciona tudo.
+        ordem_anterior = [chave for chave in anteriores if chave in novas]
+        ordem_nova = [chave for chave, _ in linhas if chave in anteriores]
+        reordenar = ordem_anterior != ordem_nova
+
+        atuais = {}
+        por_iid = {}
+        for indice, (chave, valores) in enumerate(linhas):
+            iid, exibidos = anteriores.get(chave, (None, None))
+            if iid is None:
+                # A chave do registro é o iid da linha: a seleção se resolve
+                # sem ler os valores exibidos de volta do Tk
+                iid = tree.insert("", indice, iid=str(chave), values=valores)
+            else:
+                if exibidos != valores:
+                    tree.item(iid, values=valores)
+                if reordenar:
+                    tree.move(iid, "", indice)
+            atuais[chave] = (iid, valores)
+            por_iid[iid] = chave
+
+        self._linhas_treeview[tree] = atuais
+        self._chaves_por_iid[tree] = por_iid
+
+    def _chaves_selecionadas(self, tree):
+        """Chaves dos registros selecionados na Treeview, na ordem da seleção."""
+        por_iid = self._chaves_por_iid.get(tree, {})
+        return [por_iid[iid] for iid in tree.selection() if iid in por_iid]
 
     def _limpar_campos(self, widgets):
         for widget in widgets:
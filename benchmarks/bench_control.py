@@ -0,0 +1,239 @@
+"""Benchmark do Control com dados sintéticos, sem interface gráfica.
+
+Gera produtos, motoboys e pedidos em um diretório temporário e mede, para
+cada tamanho de histórico, o tempo de carga, inclusão de pedidos, exclusão
+em massa, montagem da página da lista de pedidos e o cálculo financeiro.
+O resultado sai em JSON, para comparar versões:
+
+    python benchmarks/bench_control.py --tamanhos 10000 100000 --saida bench.json
+"""
+import argparse
+import json
+import os
+import platform
+import random
+import shutil
+import statistics
+import sys
+import tempfile
+import time
+import tracemalloc
+from datetime import datetime, timedelta
+
+sys.path.insert(0, os.path.join(os.path.dirname(os.path.abspath(__file__)), '..'))
+
+import control_core  # noqa: E402
+from control_core import (  # noqa: E402
+    DADOS,
+    FORMATO_DATA,
+    PERCENTUAL_IFOOD,
+    TIPOS_PEDIDO,
+    DataManager,
+    Sistema,
+    criar_backend,
+)
+
+PEDIDOS_POR_PAGINA = 200
+
+
+def gerar_dados(diretorio, quantidade_pedidos, quantidade_produtos, quantidade_motoboys, semente=42):
+    """Grava produtos.json, motoboys.json e pedidos.json sintéticos em `diretorio`."""
+    aleatorio = random.Random(semente)
+    produtos = [{'nome': f'Produto {i:05d}', 'quantidade': 10 ** 9, 'preco': round(aleatorio.uniform(2, 80), 2)}
+                for i in range(quantidade_produtos)]
+    motoboys = [{'nome': f'Motoboy {i:03d}', 'valor_por_entrega': float(aleatorio.randint(5, 15))}
+                for i in range(quantidade_motoboys)]
+
+    inicio = datetime(2022, 1, 1)
+    intervalo = timedelta(days=3 * 365) / max(quantidade_pedidos, 1)
+    pedidos = []
+    for i in range(1, quantidade_pedidos + 1):
+        tipo = aleatorio.choice(TIPOS_PEDIDO)
+        itens = []
+        # A maioria dos pedidos tem um item só
+        for produto in aleatorio.sample(produtos, aleatorio.choices([1, 2, 3], weights=[70, 20, 10])[0]):
+            preco = produto['preco']
+            if tipo == 'iFood':
+                preco = round(preco * (1 + PERCENTUAL_IFOOD), 2)
+            itens.append({'produto': produto['nome'], 'quantidade': aleatorio.randint(1, 5),
+                          'preco_unitario': preco})
+        pedidos.append({
+            'id': i,
+            'cliente': f'Cliente {aleatorio.randint(1, 5000)}',
+            'data': (inicio + intervalo * i).strftime(FORMATO_DATA),
+            'tipo': tipo,
+            'itens': itens,
+            'motoboy': aleatorio.choice(motoboys)['nome'] if tipo != 'Loja' else 'Retirada na Loja',
+            'total': sum(item['preco_unitario'] * item['quantidade'] for item in itens)
+        })
+
+    DataManager.salvar(os.path.join(diretorio, DADOS['produtos']), produtos)
+    DataManager.salvar(os.path.join(diretorio, DADOS['motoboys']), motoboys)
+    # Arquivo único das versões anteriores, do mais recente ao mais antigo;
+    # o JsonBackend o divide em partições mensais na primeira abertura
+    DataManager.salvar(os.path.join(diretorio, DADOS['pedidos']), pedidos[::-1])
+
+
+def cronometrar(funcao):
+    inicio = time.perf_counter()
+    resultado = funcao()
+    return time.perf_counter() - inicio, resultado
+
+
+def estatisticas(latencias):
+    """Vazão e percentis (em milissegundos) de uma lista de latências em segundos."""
+    ordenadas = sorted(latencias)
+
+    def percentil(p):
+        return ordenadas[min(int(len(ordenadas) * p), len(ordenadas) - 1)] * 1000
+
+    total = sum(ordenadas)
+    return {
+        'operacoes': len(ordenadas),
+        'total_s': round(total, 6),
+        'vazao_ops_s': round(len(ordenadas) / total, 2) if total else None,
+        'media_ms': round(statistics.mean(ordenadas) * 1000, 4),
+        'p50_ms': round(percentil(0.50), 4),
+        'p95_ms': round(percentil(0.95), 4),
+        'p99_ms': round(percentil(0.99), 4),
+        'max_ms': round(ordenadas[-1] * 1000, 4)
+    }
+
+
+def pico_memoria(funcao):
+    """Executa `funcao` sob tracemalloc e retorna (resultado, pico em MiB)."""
+    tracemalloc.start()
+    try:
+        resultado = funcao()
+        _, pico = tracemalloc.get_traced_memory()
+    finally:
+        tracemalloc.stop()
+    return resultado, round(pico / 2 ** 20, 2)
+
+
+def linhas_da_pagina(sistema, pagina=0):
+    # Mesmos valores que App._atualizar_lista_pedidos envia para a Treeview
+    return [(
+        '' if p.id is None else p.id,
+        p.cliente,
+        p.data,
+        p.tipo,
+        p.itens[0].produto if len(p.itens) == 1 else ", ".join(f"{i.quantidade}x {i.produto}" for i in p.itens),
+        p.quantidade,
+        f"{p.itens[0].preco_unitario:.2f}" if len(p.itens) == 1 else "",
+        p.motoboy,
+        f"{p.total:.2f}"
+    ) for p in sistema.pedidos.fatia(pagina * PEDIDOS_POR_PAGINA, PEDIDOS_POR_PAGINA, decrescente=True)]
+
+
+def executar(quantidade_pedidos, args):
+    diretorio = tempfile.mkdtemp(prefix='control-bench-')
+    diretorio_original = os.getcwd()
+    try:
+        os.chdir(diretorio)
+        tempo_geracao, _ = cronometrar(lambda: gerar_dados(
+            diretorio, quantidade_pedidos, args.produtos, args.motoboys))
+        resultado = {
+            'pedidos': quantidade_pedidos,
+            'geracao_s': round(tempo_geracao, 3),
+            'tamanho_pedidos_mb': round(os.path.getsize(DADOS['pedidos']) / 2 ** 20, 2)
+        }
+
+        # A primeira abertura migra o pedidos.json (para as partições mensais
+        # ou para o SQLite); a carga é medida depois dela
+        tempo, sistema = cronometrar(lambda: Sistema(criar_backend(args.backend)))
+        sistema.fechar()
+        resultado['migracao_s'] = round(tempo, 4)
+
+        # Carga (equivalente a App._carregar_dados); o pico de memória é medido
+        # em uma segunda carga, já que o tracemalloc distorce o tempo
+        sistema, pico = pico_memoria(lambda: Sistema(criar_backend(args.backend)))
+        sistema.fechar()
+        def abrir_janela():
+            # O que App._carregar_dados faz antes de mostrar a janela
+            sistema = Sistema(criar_backend(args.backend), progressivo=True)
+            sistema.carregar_proxima_parte()
+            while len(sistema.pedidos) < PEDIDOS_POR_PAGINA and sistema.carregar_proxima_parte():
+                pass
+            linhas_da_pagina(sistema)
+            return sistema
+
+        tempo_janela, sistema = cronometrar(abrir_janela)
+        sistema.fechar()
+        tempo_carga, sistema = cronometrar(lambda: Sistema(criar_backend(args.backend)))
+        resultado['carga'] = {'tempo_s': round(tempo_carga, 4), 'pico_memoria_mb': pico,
+                              'primeira_pagina_s': round(tempo_janela, 4)}
+
+        # Inclusão de pedidos, um lote gravado por pedido como na interface
+        aleatorio = random.Random(7)
+        produtos = [p.nome for p in sistema.produtos]
+        motoboys = [m.nome for m in sistema.motoboys]
+        latencias, ids_novos = [], []
+        for _ in range(args.inclusoes):
+            tipo = aleatorio.choice(TIPOS_PEDIDO)
+            tempo, pedido = cronometrar(lambda: sistema.servico_pedidos.criar(
+                'Bench', tipo, [(aleatorio.choice(produtos), 1)], aleatorio.choice(motoboys)))
+            latencias.append(tempo)
+            ids_novos.append(pedido.id)
+        resultado['inclusao_pedido'] = estatisticas(latencias)
+
+        # Montagem da primeira página da lista de pedidos
+        latencias = [cronometrar(lambda: linhas_da_pagina(sistema))[0] for _ in range(args.repeticoes)]
+        resultado['atualizacao_lista'] = estatisticas(latencias)
+
+        # Resumo financeiro: recálculo completo, total acumulado e período
+        latencias = [cronometrar(sistema.financas.recalcular)[0] for _ in range(args.repeticoes)]
+        resultado['calculo_financeiro'] = estatisticas(latencias)
+        latencias = [cronometrar(lambda: sistema.financas.resumo_periodo('Mês'))[0]
+                     for _ in range(args.repeticoes)]
+        resultado['resumo_periodo_mes'] = estatisticas(latencias)
+        latencias = [cronometrar(lambda: sistema.financas.totais_por_produto('Mês'))[0]
+                     for _ in range(args.repeticoes)]
+        resultado['totais_por_produto_mes'] = estatisticas(latencias)
+
+        # Exclusão em massa de pedidos antigos e dos recém-incluídos
+        ids = [p.id for p in sistema.pedidos.fatia(0, args.exclusao_massa)] + ids_novos
+        tempo, removidos = cronometrar(lambda: sistema.servico_pedidos.excluir(ids))
+        resultado['exclusao_massa'] = {'pedidos': len(removidos), 'tempo_s': round(tempo, 4)}
+
+        tempo, _ = cronometrar(sistema.fechar)
+        resultado['fechamento_s'] = round(tempo, 4)
+        return resultado
+    finally:
+        os.chdir(diretorio_original)
+        shutil.rmtree(diretorio, ignore_errors=True)
+
+
+def main(argv=None):
+    parser = argparse.ArgumentParser(description=__doc__.splitlines()[0])
+    parser.add_argument('--tamanhos', type=int, nargs='+', default=[10_000, 100_000, 1_000_000],
+                        help='quantidades de pedidos no histórico sintético')
+    parser.add_argument('--backend', default='json', help="backend de armazenamento ('json' ou 'sqlite')")
+    parser.add_argument('--produtos', type=int, default=500)
+    parser.add_argument('--motoboys', type=int, default=30)
+    parser.add_argument('--inclusoes', type=int, default=500, help='pedidos incluídos por tamanho')
+    parser.add_argument('--exclusao-massa', type=int, default=5000, help='pedidos excluídos de uma vez')
+    parser.add_argument('--repeticoes', type=int, default=20, help='repetições das medições de leitura')
+    parser.add_argument('--saida', help='arquivo JSON de saída (padrão: stdout)')
+    args = parser.parse_args(argv)
+
+    relatorio = {
+        'data': datetime.now().isoformat(timespec='seconds'),
+        'python': platform.python_version(),
+        'plataforma': platform.platform(),
+        'backend': args.backend,
+        'colunar': control_core.ARMAZENAMENTO_COLUNAR,
+        'numpy': control_core.numpy is not None,
+        'resultados': [executar(tamanho, args) for tamanho in args.tamanhos]
+    }
+
+    texto = json.dumps(relatorio, indent=2, ensure_ascii=False)
+    if args.saida:
+        with open(args.saida, 'w', encoding='utf-8') as f:
+            f.write(texto + '\n')
+    else:
+        print(texto)
+
+
+if __name__ == '__main__':
+    main()
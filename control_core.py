@@ -0,0 +1,2440 @@
+"""Núcleo do Control: armazenamento, índices em memória e regras de negócio.
+
+Não depende do Tkinter, então pode ser usado em importações em lote,
+benchmarks e automações sem tela.
+"""
+from array import array
+import csv
+import json
+from bisect import bisect_left, insort
+from collections import Counter
+from contextlib import contextmanager
+from copy import copy
+from dataclasses import dataclass
+from datetime import datetime, timedelta
+from functools import lru_cache
+import gzip
+import heapq
+import lzma
+import os
+import pickle
+import queue
+import re
+import sqlite3
+from sys import intern
+import threading
+from xml.sax.saxutils import escape
+import zipfile
+
+try:
+    import numpy
+except ImportError:  # agregações em Python puro sobre as colunas
+    numpy = None
+
+# Arquivos de dados
+DADOS = {
+    'produtos': 'produtos.json',
+    'motoboys': 'motoboys.json',
+    'pedidos': 'pedidos.json',
+    'pedidos_particoes': 'pedidos',
+    'pedidos_journal': 'pedidos.journal.jsonl',
+    'meta': 'meta.json',
+    'sqlite': 'control.db'
+}
+
+# Campo que identifica cada registro nas coleções
+CHAVES = {
+    'produtos': 'nome',
+    'motoboys': 'nome',
+    'pedidos': 'id'
+}
+
+# Backend de armazenamento: 'json' (padrão) ou 'sqlite'
+BACKEND = os.environ.get('CONTROL_BACKEND', 'json')
+
+# Compressão dos meses de pedidos já encerrados: 'gzip' (padrão) ou 'lzma'
+COMPRESSAO = os.environ.get('CONTROL_COMPRESSAO', 'gzip')
+EXTENSOES_COMPRESSAO = {'gzip': '.gz', 'lzma': '.xz'}
+# O DataManager escolhe o descompressor pela extensão do arquivo
+COMPRESSORES = {'.gz': gzip, '.xz': lzma}
+
+# Mantém uma cópia colunar dos pedidos para os resumos financeiros ('0' desliga)
+ARMAZENAMENTO_COLUNAR = os.environ.get('CONTROL_COLUNAR', '1') != '0'
+
+PERCENTUAL_IFOOD = 0.20
+
+# Canais de venda; apenas 'Loja' dispensa motoboy
+TIPOS_PEDIDO = ['Loja', 'iFood', 'Robô']
+
+# Formato de data gravado nos pedidos
+FORMATO_DATA = "%d/%m/%Y %H:%M"
+
+# Períodos disponíveis no resumo financeiro
+PERIODOS = ['Tudo', 'Hoje', 'Semana', 'Mês', 'Personalizado']
+
+# Quantidade de eventos no journal antes de compactar nas partições mensais
+LIMITE_COMPACTACAO = 500
+
+# Pedidos entregues por vez na carga progressiva do histórico
+TAMANHO_PARTE = 5000
+
+# Partição dos pedidos sem data válida (a mais antiga de todas)
+MES_SEM_DATA = '0000-00'
+
+# Subdiretório das partições de pedidos com os meses encerrados, comprimidas
+DIRETORIO_ARQUIVADOS = 'arquivados'
+
+# Cópia binária (pickle) gravada ao lado dos JSON lidos na abertura
+EXTENSAO_CACHE = '.cache'
+
+# A partir de quantas remoções de uma vez as listas ordenadas são reconstruídas
+LIMITE_REMOCAO_INDIVIDUAL = 32
+
+# Erros de importação listados na mensagem antes do resumo "e mais N"
+LIMITE_ERROS_IMPORTACAO = 20
+
+# Colunas da exportação de pedidos (uma linha por item, no formato da importação)
+COLUNAS_EXPORTACAO = ['pedido', 'data', 'cliente', 'tipo', 'motoboy',
+                      'produto', 'quantidade', 'preco_unitario', 'total_item', 'total']
+
+# Espaços e vírgulas entre os itens de uma lista JSON
+_SEPARADORES_JSON = re.compile(r'[\s,]*')
+
+@dataclass(slots=True)
+class Produto:
+    nome: str
+    quantidade: int
+    preco: float
+
+    @classmethod
+    def de_dict(cls, dados):
+        return cls(dados['nome'], dados['quantidade'], dados['preco'])
+
+    def para_dict(self):
+        return {'nome': self.nome, 'quantidade': self.quantidade, 'preco': self.preco}
+
+@dataclass(slots=True)
+class Motoboy:
+    nome: str
+    valor_por_entrega: float
+
+    @classmethod
+    def de_dict(cls, dados):
+        return cls(dados['nome'], dados['valor_por_entrega'])
+
+    def para_dict(self):
+        return {'nome': self.nome, 'valor_por_entrega': self.valor_por_entrega}
+
+@dataclass(slots=True)
+class ItemPedido:
+    produto: str
+    quantidade: int
+    preco_unitario: float
+
+    def __post_init__(self):
+        self.produto = intern(self.produto)
+
+    @property
+    def total(self):
+        return self.preco_unitario * self.quantidade
+
+    @classmethod
+    def de_dict(cls, dados):
+        return cls(dados['produto'], dados['quantidade'], dados['preco_unitario'])
+
+    def para_dict(self):
+        return {'produto': self.produto, 'quantidade': self.quantidade,
+                'preco_unitario': self.preco_unitario}
+
+@dataclass(slots=True)
+class Pedido:
+    """Pedido em memória: sem dicionário por instância e com os nomes
+    repetidos (canal, produto e motoboy) internados, compartilhados entre
+    todos os pedidos."""
+    id: int
+    cliente: str
+    data: str
+    tipo: str
+    itens: tuple
+    motoboy: str
+    total: float
+
+    def __post_init__(self):
+        self.tipo = intern(self.tipo)
+        self.itens = tuple(self.itens)
+        self.motoboy = intern(self.motoboy)
+
+    @property
+    def quantidade(self):
+        return sum(i.quantidade for i in self.itens)
+
+    @classmethod
+    def de_dict(cls, dados):
+        # Pedidos gravados por versões antigas podem não ter id nem cliente e
+        # guardam um único produto nos próprios campos, sem a lista de itens
+        itens = dados.get('itens', (dados,))
+        return cls(dados.get('id'), dados.get('cliente', ''), dados['data'], dados['tipo'],
+                   [ItemPedido.de_dict(i) for i in itens], dados['motoboy'], dados['total'])
+
+    def para_dict(self):
+        return {
+            'id': self.id,
+            'cliente': self.cliente,
+            'data': self.data,
+            'tipo': self.tipo,
+            'itens': [i.para_dict() for i in self.itens],
+            'motoboy': self.motoboy,
+            'total': self.total
+        }
+
+# Tipo de registro de cada coleção (conversão de/para os dicionários gravados)
+TIPOS_REGISTRO = {
+    'produtos': Produto,
+    'motoboys': Motoboy,
+    'pedidos': Pedido
+}
+
+class DataManager:
+    """Leitura e gravação dos arquivos JSON.
+
+    Arquivos terminados em .gz ou .xz são comprimidos e descomprimidos de
+    forma transparente (gzip e lzma da biblioteca padrão). `carregar(...,
+    cache=True)` usa uma cópia em pickle (arquivo + EXTENSAO_CACHE) enquanto o
+    mtime e o tamanho do JSON forem os registrados nela, e a refaz quando
+    precisa ler o JSON. As gravações não tocam na cópia: a nova assinatura do
+    JSON já a invalida. O JSON continua sendo a fonte dos dados e a cópia
+    pode ser apagada a qualquer hora.
+    """
+
+    @staticmethod
+    def abrir(arquivo):
+        """Abre um arquivo JSON para leitura, descomprimindo conforme a extensão."""
+        compressor = COMPRESSORES.get(os.path.splitext(arquivo)[1])
+        if compressor is None:
+            return open(arquivo, 'r', encoding='utf-8')
+        return compressor.open(arquivo, 'rt', encoding='utf-8')
+
+    @staticmethod
+    def carregar(arquivo, cache=False):
+        if not os.path.exists(arquivo):
+            return []
+        # Comprimidos não ganham cópia: ela desfaria a economia de espaço
+        cache = cache and os.path.splitext(arquivo)[1] not in COMPRESSORES
+        if cache:
+            assinatura = DataManager._assinatura(arquivo)
+            try:
+                with open(arquivo + EXTENSAO_CACHE, 'rb') as f:
+                    registrada, dados = pickle.load(f)
+                if registrada == assinatura:
+                    return dados
+            except (OSError, EOFError, ValueError, TypeError, pickle.UnpicklingError):
+                # Cópia ausente ou ilegível: o JSON é lido e a cópia refeita
+                pass
+        with DataManager.abrir(arquivo) as f:
+            dados = json.load(f)
+        if cache:
+            DataManager._gravar_cache(arquivo, dados, assinatura)
+        return dados
+
+    @staticmethod
+    def salvar(arquivo, dados):
+        """Grava em um arquivo temporário e substitui o original atomicamente.
+
+        Arquivos comprimidos são gravados sem indentação: não são lidos à mão.
+        """
+        temporario = arquivo + '.tmp'
+        compressor = COMPRESSORES.get(os.path.splitext(arquivo)[1])
+        if compressor is None:
+            with open(temporario, 'w', encoding='utf-8') as f:
+                json.dump(dados, f, indent=2, ensure_ascii=False)
+                f.flush()
+                os.fsync(f.fileno())
+        else:
+            with open(temporario, 'wb') as bruto:
+                # Fechar o compressor grava o final do fluxo; o arquivo bruto continua aberto para o fsync
+                with compressor.open(bruto, 'wt', encoding='utf-8') as f:
+                    json.dump(dados, f, ensure_ascii=False, separators=(',', ':'))
+                bruto.flush()
+                os.fsync(bruto.fileno())
+        os.replace(temporario, arquivo)
+
+    @staticmethod
+    def _assinatura(arquivo):
+        informacoes = os.stat(arquivo)
+        return informacoes.st_mtime_ns, informacoes.st_size
+
+    @staticmethod
+    def _gravar_cache(arquivo, dados, assinatura):
+        temporario = arquivo + EXTENSAO_CACHE + '.tmp'
+        try:
+            with open(temporario, 'wb') as f:
+                pickle.dump((assinatura, dados), f, pickle.HIGHEST_PROTOCOL)
+            os.replace(temporario, arquivo + EXTENSAO_CACHE)
+        except OSError:
+            # Sem a cópia a próxima abertura só fica mais lenta
+            pass
+
+    @staticmethod
+    def registrar(arquivo, eventos):
+        """Acrescenta eventos (create/update/delete) ao journal, um JSON por linha."""
+        linhas = ''.join(json.dumps(e, ensure_ascii=False) + '\n' for e in eventos).encode('utf-8')
+        # Sem buffer: se a escrita falhar, nada fica para ser gravado no close()
+        with open(arquivo, 'ab', buffering=0) as f:
+            inicio = f.seek(0, os.SEEK_END)
+            try:
+                f.write(linhas)
+                os.fsync(f.fileno())
+            except OSError:
+                # Desfaz a linha cortada: quem chamou grava os mesmos eventos de novo
+                f.truncate(inicio)
+                raise
+
+    @staticmethod
+    def iterar(arquivo, tamanho_bloco=1 << 16):
+        """Percorre uma lista JSON item a item, lendo o arquivo em blocos.
+
+        Evita montar o texto inteiro e a lista completa em memória de uma vez.
+        """
+        if not os.path.exists(arquivo):
+            return
+        # Cada raw_decode tem seu próprio cache de chaves; este dicionário faz
+        # os registros do arquivo compartilharem as strings das chaves, como no json.load
+        chaves = {}
+        decodificador = json.JSONDecoder(
+            object_pairs_hook=lambda pares: {chaves.setdefault(c, c): v for c, v in pares})
+        with DataManager.abrir(arquivo) as f:
+            texto = f.read(tamanho_bloco)
+            posicao = _SEPARADORES_JSON.match(texto).end()
+            if texto[posicao:posicao + 1] != '[':
+                raise ValueError(f"{arquivo} não contém uma lista JSON")
+            posicao += 1
+            fim_arquivo = False
+            while True:
+                posicao = _SEPARADORES_JSON.match(texto, posicao).end()
+                if texto[posicao:posicao + 1] == ']':
+                    return
+                try:
+                    item, posicao = decodificador.raw_decode(texto, posicao)
+                except json.JSONDecodeError:
+                    # Item cortado no fim do bloco: lê o próximo e tenta de novo
+                    if fim_arquivo:
+                        raise
+                    bloco = f.read(tamanho_bloco)
+                    fim_arquivo = not bloco
+                    texto, posicao = texto[posicao:] + bloco, 0
+                    continue
+                yield item
+
+    @staticmethod
+    def ler_journal(arquivo_journal, chave='id', meta=None, reparar=True):
+        """Lê os eventos do journal sem tocar no snapshot.
+
+        Retorna os registros criados (por chave, na ordem do journal), as chaves
+        excluídas e a quantidade de eventos lidos. Eventos 'meta' atualizam o
+        dicionário `meta`, se informado. Com `reparar=False` uma última linha
+        truncada é só ignorada, sem alterar o arquivo.
+        """
+        registros = {}
+        excluidos = set()
+        eventos = 0
+        if os.path.exists(arquivo_journal):
+            with open(arquivo_journal, 'rb+' if reparar else 'rb') as f:
+                posicao = 0
+                for linha in f:
+                    try:
+                        if not linha.endswith(b'\n'):
+                            raise ValueError
+                        evento = json.loads(linha.decode('utf-8'))
+                    except ValueError:
+                        # Última linha truncada (queda de energia no meio da escrita):
+                        # descarta para que os próximos eventos não fiquem corrompidos
+                        if reparar:
+                            f.truncate(posicao)
+                        break
+                    posicao += len(linha)
+                    if evento['op'] == 'delete':
+                        registros.pop(evento[chave], None)
+                        excluidos.add(evento[chave])
+                    elif evento['op'] == 'meta':
+                        if meta is not None:
+                            meta[evento['chave']] = evento['valor']
+                    else:
+                        registros[evento['registro'][chave]] = evento['registro']
+                        excluidos.discard(evento['registro'][chave])
+                    eventos += 1
+
+        return registros, excluidos, eventos
+
+def mes_do_pedido(data):
+    """Partição ('AAAA-MM') de um pedido pela sua data no FORMATO_DATA."""
+    if isinstance(data, str) and len(data) >= 10 and data[2] == '/' and data[5] == '/':
+        return f"{data[6:10]}-{data[3:5]}"
+    return MES_SEM_DATA
+
+def numerar_pedidos_sem_id(pedidos, ultimo_id=0):
+    """Dá ids novos, depois do maior existente, aos pedidos (dicionários) sem id.
+
+    Versões antigas gravavam pedidos sem id; sem ele não há como indexá-los.
+    Retorna o último id usado.
+    """
+    ultimo_id = max([ultimo_id] + [p['id'] for p in pedidos if p.get('id') is not None])
+    for p in pedidos:
+        if p.get('id') is None:
+            ultimo_id += 1
+            p['id'] = ultimo_id
+    return ultimo_id
+
+class JsonBackend:
+    """Armazena cada coleção em um arquivo .json; pedidos passam pelo journal.
+
+    Os pedidos ficam em um arquivo por mês (pedidos/AAAA-MM.json) descrito por
+    pedidos/manifesto.json; a compactação do journal regrava só os meses que
+    tiveram alterações. Meses encerrados vão comprimidos para
+    pedidos/arquivados/ e só são lidos quando a carga chega até eles.
+
+    Recebe e devolve registros (Produto, Motoboy, Pedido); a conversão para
+    dicionários acontece só na leitura e na gravação.
+    """
+
+    particionado = True
+
+    def __init__(self, arquivos=DADOS):
+        self.arquivos = arquivos
+        self._registros = {}
+        self._sem_chave = {}
+        self._eventos_journal = 0
+        self._profundidade = 0
+        self._sujos = set()
+        self._eventos_pendentes = []
+        self._meta = DataManager.carregar(self.arquivos['meta']) or {}
+        self._arquivo_manifesto = os.path.join(self.arquivos['pedidos_particoes'], 'manifesto.json')
+        self._manifesto = DataManager.carregar(self._arquivo_manifesto) or {'particoes': {}}
+        # Pedidos excluídos desde o início da sessão, ainda presentes em partições não carregadas
+        self._excluidos = set()
+        self._particao_pendente = None
+        # Meses que a carga progressiva ainda não entregou; None antes de ela começar
+        self._meses_pendentes = None
+        # A carga lê uma partição inteira por vez; a compactação não a regrava no meio da leitura
+        self._trava_particoes = threading.Lock()
+        # Arquivos substituídos, apagados só depois que o manifesto deixa de apontá-los
+        self._obsoletos = []
+        if os.path.exists(self.arquivos['pedidos']) and not os.path.exists(self._arquivo_manifesto):
+            self._dividir_snapshot()
+        elif any('motoboys' not in particao for particao in self._manifesto['particoes'].values()):
+            self._contar_motoboys_das_particoes()
+        # O journal é lido já na construção: seus eventos 'meta' (sequência de
+        # ids) precisam valer antes que algum pedido novo receba um id
+        self._journal, excluidos, self._eventos_journal = DataManager.ler_journal(
+            self.arquivos['pedidos_journal'], CHAVES['pedidos'], self._meta)
+        self._excluidos |= excluidos
+        # Ids das partições ainda não carregadas também contam para a sequência
+        maior_id = max(max((p['maior_id'] for p in self._manifesto['particoes'].values()), default=0),
+                       max(self._journal, default=0))
+        if maior_id > self._meta.get('ultimo_id_pedido', 0):
+            self._meta['ultimo_id_pedido'] = maior_id
+
+    def carregar(self, colecao):
+        if colecao == 'pedidos':
+            return [r for parte in self.carregar_em_partes(colecao) for r in parte]
+
+        chave = CHAVES[colecao]
+        dados = [TIPOS_REGISTRO[colecao].de_dict(d)
+                 for d in DataManager.carregar(self.arquivos[colecao], cache=True)]
+        self._sem_chave[colecao] = []
+        self._registros[colecao] = {getattr(r, chave): r for r in dados}
+        # Produtos e motoboys são alterados no lugar pela interface; o backend
+        # mantém cópias próprias para poder gravá-las em outra thread
+        return [copy(r) for r in dados]
+
+    def carregar_em_partes(self, colecao, tamanho=None):
+        """Gera os registros em listas, dos mais recentes aos mais antigos.
+
+        Para pedidos cada parte é uma partição mensal inteira (`tamanho` não se
+        aplica); a primeira traz também os pedidos do journal, os mais novos.
+        As partições seguintes só são lidas quando a próxima parte é pedida,
+        pulando o que o journal ou a sessão já substituiu ou excluiu.
+        """
+        if colecao != 'pedidos':
+            yield self.carregar(colecao)
+            return
+
+        recentes, self._journal = self._journal, None
+        if recentes is None:
+            # Carga repetida: o journal lido na construção pode já ter sido compactado
+            recentes, excluidos, self._eventos_journal = DataManager.ler_journal(
+                self.arquivos['pedidos_journal'], CHAVES[colecao], self._meta)
+            self._excluidos |= excluidos
+        # Pedidos criados na sessão antes desta carga já estão no índice
+        indice = self._registros.setdefault(colecao, {})
+        parte = []
+        for c, dados in recentes.items():
+            if c not in indice:
+                indice[c] = Pedido.de_dict(dados)
+                parte.append(indice[c])
+        parte.reverse()
+        meses = sorted(self._manifesto['particoes'], reverse=True)
+        self._meses_pendentes = meses
+        for posicao, mes in enumerate(meses):
+            with self._trava_particoes:
+                for dados in self._ler_particao(mes, cache=True):
+                    r = Pedido.de_dict(dados)
+                    if r.id is not None:
+                        if r.id in indice or r.id in self._excluidos:
+                            continue
+                        indice[r.id] = r
+                    parte.append(r)
+            self._particao_pendente = meses[posicao + 1] if posicao + 1 < len(meses) else None
+            self._meses_pendentes = meses[posicao + 1:]
+            yield parte
+            parte = []
+        if parte:
+            yield parte
+
+    def particao_pendente(self):
+        """Mês ('AAAA-MM') da próxima partição de pedidos a carregar; None se não se sabe."""
+        return self._particao_pendente
+
+    def pedidos_nao_carregados(self, ignorar=(), motoboy=None):
+        """Pedidos que a carga progressiva ainda não entregou, em ordem de data.
+
+        Os meses pendentes e as exclusões são fixados na chamada; as partições
+        só são lidas quando o gerador devolvido é consumido (pela thread de uma
+        exportação, por exemplo), sem alterar a carga. `ignorar` são os ids
+        que quem chama já tem em memória. Com `motoboy`, só os pedidos dele,
+        lendo apenas os meses em que o manifesto o conta.
+        """
+        with self._trava_particoes:
+            if self._meses_pendentes is None:
+                meses, journal = list(self._manifesto['particoes']), dict(self._journal or {})
+            else:
+                meses, journal = list(self._meses_pendentes), {}
+            if motoboy is not None:
+                particoes = self._manifesto['particoes']
+                meses = [mes for mes in meses if particoes.get(mes, {}).get('motoboys', {}).get(motoboy)]
+        pular = set(ignorar) | self._excluidos
+        return self._ler_pendentes(meses, journal, pular, motoboy)
+
+    def motoboys_nao_carregados(self):
+        """Quantos pedidos de cada motoboy a carga progressiva ainda não entregou.
+
+        Sai das contagens do manifesto, sem ler as partições; pedidos excluídos
+        desde a última compactação ainda entram na conta.
+        """
+        contagem = Counter()
+        with self._trava_particoes:
+            particoes = self._manifesto['particoes']
+            meses = particoes if self._meses_pendentes is None else self._meses_pendentes
+            for mes in meses:
+                contagem.update(particoes.get(mes, {}).get('motoboys', {}))
+            if self._meses_pendentes is None:
+                contagem.update(d.get('motoboy') for d in (self._journal or {}).values() if d.get('motoboy'))
+        return contagem
+
+    def _ler_pendentes(self, meses, journal, pular, motoboy=None):
+        # Pedidos do journal ficam no mês da sua data, no lugar da cópia da partição
+        do_journal = {}
+        for pedido_id, dados in journal.items():
+            if pedido_id not in pular and (motoboy is None or dados.get('motoboy') == motoboy):
+                do_journal.setdefault(mes_do_pedido(dados.get('data')), []).append(dados)
+        pular = pular | set(journal)
+        for mes in sorted(set(meses) | set(do_journal)):
+            with self._trava_particoes:
+                dados = [d for d in self._ler_particao(mes) if d.get('id') not in pular
+                         and (motoboy is None or d.get('motoboy') == motoboy)]
+            pedidos = [Pedido.de_dict(d) for d in dados + do_journal.get(mes, [])]
+            pedidos.sort(key=lambda p: (converter_data(p.data), p.id))
+            if pedidos:
+                yield pedidos
+
+    def salvar(self, colecao, registros):
+        """Insere ou atualiza os registros informados."""
+        chave = CHAVES[colecao]
+        indice = self._registros.setdefault(colecao, {})
+        for r in registros:
+            indice[getattr(r, chave)] = r
+
+        if colecao == 'pedidos':
+            self._eventos_pendentes.extend({'op': 'create', 'registro': r.para_dict()} for r in registros)
+        else:
+            self._sujos.add(colecao)
+        self._descarregar_se_livre()
+
+    def remover(self, colecao, chaves):
+        indice = self._registros.setdefault(colecao, {})
+        for c in chaves:
+            indice.pop(c, None)
+
+        if colecao == 'pedidos':
+            self._excluidos.update(chaves)
+            self._eventos_pendentes.extend({'op': 'delete', 'id': c} for c in chaves)
+        else:
+            self._sujos.add(colecao)
+        self._descarregar_se_livre()
+
+    def carregar_meta(self, chave, padrao=None):
+        """Valores auxiliares (ex.: sequência de ids); leia após carregar('pedidos')."""
+        return self._meta.get(chave, padrao)
+
+    def salvar_meta(self, chave, valor):
+        # Vai no journal de pedidos junto com o pedido; meta.json é gravado na compactação
+        self._meta[chave] = valor
+        self._eventos_pendentes.append({'op': 'meta', 'chave': chave, 'valor': valor})
+        self._descarregar_se_livre()
+
+    @contextmanager
+    def lote(self):
+        """Agrupa as alterações de uma ação do usuário em uma única gravação."""
+        self._profundidade += 1
+        try:
+            yield
+        finally:
+            self._profundidade -= 1
+            self._descarregar_se_livre()
+
+    def fechar(self):
+        self._descarregar_se_livre()
+        self._arquivar_meses_encerrados()
+
+    def _descarregar_se_livre(self):
+        if self._profundidade:
+            return
+        for colecao in sorted(self._sujos):
+            self._gravar(colecao)
+        self._sujos.clear()
+        if self._eventos_pendentes:
+            self._registrar_pedidos()
+
+    def _dados(self, colecao):
+        return self._sem_chave.get(colecao, []) + list(self._registros.get(colecao, {}).values())
+
+    def _gravar(self, colecao):
+        DataManager.salvar(self.arquivos[colecao], [r.para_dict() for r in self._dados(colecao)])
+
+    def _registrar_pedidos(self):
+        eventos = self._eventos_pendentes
+        DataManager.registrar(self.arquivos['pedidos_journal'], eventos)
+        # Os eventos só saem da fila depois de gravados: se o journal falhar,
+        # a próxima descarga (ou o fechamento) tenta de novo
+        self._eventos_pendentes = []
+        self._eventos_journal += len(eventos)
+        if self._eventos_journal >= LIMITE_COMPACTACAO:
+            self._compactar_pedidos()
+
+    def _compactar_pedidos(self):
+        # O journal é relido do disco: as partições não carregadas não estão em memória
+        criados, excluidos, _ = DataManager.ler_journal(self.arquivos['pedidos_journal'])
+        por_mes = {}
+        for pedido_id, dados in criados.items():
+            por_mes.setdefault(mes_do_pedido(dados.get('data')), []).append(dados)
+        substituidos = excluidos | set(criados)
+        # Um pedido excluído ou regravado pode estar em qualquer mês cuja faixa de ids o inclua
+        afetados = set(por_mes)
+        for mes, particao in self._manifesto['particoes'].items():
+            if any(particao['menor_id'] <= i <= particao['maior_id'] for i in substituidos):
+                afetados.add(mes)
+
+        with self._trava_particoes:
+            for mes in afetados:
+                dados = [d for d in self._ler_particao(mes)
+                         if d.get('id') not in substituidos]
+                self._gravar_particao(mes, dados + por_mes.get(mes, []))
+            self._salvar_manifesto()
+        DataManager.salvar(self.arquivos['meta'], self._meta)
+        open(self.arquivos['pedidos_journal'], 'w', encoding='utf-8').close()
+        self._eventos_journal = 0
+        self._arquivar_meses_encerrados()
+
+    def _arquivar_meses_encerrados(self):
+        """Comprime os meses anteriores ao atual que ainda estão em JSON legível."""
+        atual = datetime.now().strftime('%Y-%m')
+        with self._trava_particoes:
+            pendentes = [mes for mes, particao in self._manifesto['particoes'].items()
+                         if mes < atual and os.path.dirname(particao.get('arquivo', '')) != DIRETORIO_ARQUIVADOS]
+            if not pendentes:
+                return
+            for mes in pendentes:
+                self._gravar_particao(mes, list(self._ler_particao(mes)))
+            self._salvar_manifesto()
+
+    def _arquivo_particao(self, mes):
+        nome = self._manifesto['particoes'].get(mes, {}).get('arquivo', f'{mes}.json')
+        return os.path.join(self.arquivos['pedidos_particoes'], nome)
+
+    def _ler_particao(self, mes, cache=False):
+        # Só a carga da abertura usa a cópia binária; compactação, arquivamento
+        # e exportação leem o JSON direto, sem refazer uma cópia que a próxima
+        # gravação da partição invalidaria
+        arquivo = self._arquivo_particao(mes)
+        if os.path.splitext(arquivo)[1] in COMPRESSORES:
+            # Meses arquivados são descomprimidos aos poucos, sem cópia binária
+            return DataManager.iterar(arquivo)
+        return DataManager.carregar(arquivo, cache=cache)
+
+    def _gravar_particao(self, mes, dados):
+        """Grava um mês (mais recentes primeiro) e atualiza sua entrada no manifesto.
+
+        Meses anteriores ao atual são gravados comprimidos em DIRETORIO_ARQUIVADOS.
+        """
+        particoes = self._manifesto['particoes']
+        anterior = self._arquivo_particao(mes) if mes in particoes else None
+        if not dados:
+            particoes.pop(mes, None)
+            if anterior:
+                self._obsoletos.append(anterior)
+            return
+        dados.sort(key=lambda d: d.get('id') or 0, reverse=True)
+        if mes < datetime.now().strftime('%Y-%m'):
+            nome = f'{DIRETORIO_ARQUIVADOS}/{mes}.json{EXTENSOES_COMPRESSAO[COMPRESSAO]}'
+        else:
+            nome = f'{mes}.json'
+        arquivo = os.path.join(self.arquivos['pedidos_particoes'], nome)
+        os.makedirs(os.path.dirname(arquivo), exist_ok=True)
+        DataManager.salvar(arquivo, dados)
+        if anterior and anterior != arquivo:
+            self._obsoletos.append(anterior)
+        ids = [d['id'] for d in dados if d.get('id') is not None]
+        particoes[mes] = {
+            'arquivo': nome,
+            'pedidos': len(dados),
+            'menor_id': min(ids, default=0),
+            'maior_id': max(ids, default=0),
+            'motoboys': self._contar_motoboys(dados)
+        }
+
+    @staticmethod
+    def _contar_motoboys(dados):
+        # Pedidos por motoboy do mês: respondem se ele está em uso sem ler a partição
+        return dict(Counter(d['motoboy'] for d in dados if d.get('motoboy')))
+
+    def _contar_motoboys_das_particoes(self):
+        """Acrescenta as contagens por motoboy a um manifesto gravado sem elas."""
+        with self._trava_particoes:
+            for mes, particao in self._manifesto['particoes'].items():
+                if 'motoboys' not in particao:
+                    particao['motoboys'] = self._contar_motoboys(self._ler_particao(mes))
+            self._salvar_manifesto()
+
+    def _salvar_manifesto(self):
+        DataManager.salvar(self._arquivo_manifesto, self._manifesto)
+        for arquivo in self._obsoletos:
+            for caminho in (arquivo, arquivo + EXTENSAO_CACHE):
+                if os.path.exists(caminho):
+                    os.remove(caminho)
+        self._obsoletos.clear()
+
+    def _dividir_snapshot(self):
+        """Converte o pedidos.json único das versões anteriores em partições mensais."""
+        pedidos = list(DataManager.iterar(self.arquivos['pedidos']))
+        numerar_pedidos_sem_id(pedidos, self._meta.get('ultimo_id_pedido', 0))
+        por_mes = {}
+        for dados in pedidos:
+            por_mes.setdefault(mes_do_pedido(dados.get('data')), []).append(dados)
+        with self._trava_particoes:
+            for mes, dados in por_mes.items():
+                self._gravar_particao(mes, dados)
+            # O manifesto marca a conversão como concluída; só então o arquivo antigo sai
+            self._salvar_manifesto()
+        os.remove(self.arquivos['pedidos'])
+
+class LeitorJson:
+    """Lê os arquivos do JsonBackend sem alterar nada no disco.
+
+    Aceita tanto as partições mensais quanto o pedidos.json único das versões
+    anteriores, com o journal aplicado por cima; usado na migração para o SQLite.
+    """
+
+    def __init__(self, arquivos=DADOS):
+        self.arquivos = arquivos
+        self._meta = DataManager.carregar(arquivos['meta']) or {}
+        self._criados, self._excluidos, _ = DataManager.ler_journal(
+            arquivos['pedidos_journal'], CHAVES['pedidos'], self._meta, reparar=False)
+
+    def carregar(self, colecao):
+        if colecao != 'pedidos':
+            return [TIPOS_REGISTRO[colecao].de_dict(d) for d in DataManager.carregar(self.arquivos[colecao])]
+
+        diretorio = self.arquivos['pedidos_particoes']
+        manifesto = DataManager.carregar(os.path.join(diretorio, 'manifesto.json'))
+        if manifesto:
+            arquivos = [os.path.join(diretorio, particao.get('arquivo', f'{mes}.json'))
+                        for mes, particao in sorted(manifesto['particoes'].items())]
+        else:
+            arquivos = [self.arquivos['pedidos']]
+        substituidos = self._excluidos | set(self._criados)
+        pedidos = [d for arquivo in arquivos for d in DataManager.iterar(arquivo)
+                   if d.get('id') not in substituidos]
+        pedidos.extend(self._criados.values())
+        ultimo_id = numerar_pedidos_sem_id(pedidos, self._meta.get('ultimo_id_pedido', 0))
+        self._meta['ultimo_id_pedido'] = ultimo_id
+        return [Pedido.de_dict(d) for d in pedidos]
+
+    def meta(self):
+        """Valores auxiliares (ex.: sequência de ids); completos após carregar('pedidos')."""
+        return dict(self._meta)
+
+class SQLiteBackend:
+    """Armazena as coleções em um banco SQLite (modo WAL) com índices.
+
+    Cada registro é guardado como JSON na coluna `dados`; as colunas de
+    chave e de data existem apenas para indexação.
+    """
+
+    particionado = False
+
+    ESQUEMA = """
+        CREATE TABLE IF NOT EXISTS produtos (nome TEXT PRIMARY KEY, dados TEXT NOT NULL);
+        CREATE INDEX IF NOT EXISTS idx_produtos_nome_nocase ON produtos (nome COLLATE NOCASE);
+        CREATE TABLE IF NOT EXISTS motoboys (nome TEXT PRIMARY KEY, dados TEXT NOT NULL);
+        CREATE INDEX IF NOT EXISTS idx_motoboys_nome_nocase ON motoboys (nome COLLATE NOCASE);
+        CREATE TABLE IF NOT EXISTS pedidos (
+            id INTEGER PRIMARY KEY,
+            data TEXT,
+            motoboy TEXT,
+            dados TEXT NOT NULL
+        );
+        CREATE INDEX IF NOT EXISTS idx_pedidos_data ON pedidos (data);
+        CREATE INDEX IF NOT EXISTS idx_pedidos_motoboy ON pedidos (motoboy);
+        CREATE TABLE IF NOT EXISTS meta (chave TEXT PRIMARY KEY, valor TEXT);
+    """
+
+    def __init__(self, arquivo=DADOS['sqlite'], arquivos_json=DADOS, tamanho_parte=TAMANHO_PARTE):
+        self.arquivo = arquivo
+        # Pedidos por parte na carga progressiva e na leitura dos não carregados
+        self.tamanho_parte = tamanho_parte
+        self._profundidade = 0
+        # Menor id já entregue pela carga progressiva; None antes de ela começar
+        self._menor_id_carregado = None
+        # Pedidos gravados ou excluídos na sessão: a memória já os tem como
+        # devem ficar, então a carga progressiva os pula ao chegar neles
+        self._alterados_na_sessao = set()
+        # A conexão é criada aqui mas usada pela thread do PersistenceWorker
+        self.conexao = sqlite3.connect(arquivo, check_same_thread=False)
+        self.conexao.execute('PRAGMA journal_mode=WAL')
+        self.conexao.execute('PRAGMA synchronous=NORMAL')
+        self.conexao.executescript(self.ESQUEMA)
+        self._migrar_json(arquivos_json)
+
+    def _migrar_json(self, arquivos_json):
+        """Importa os arquivos .json existentes na primeira execução."""
+        if self.conexao.execute("SELECT 1 FROM meta WHERE chave = 'migrado'").fetchone():
+            return
+        origem = LeitorJson(arquivos_json)
+        with self.conexao:
+            for colecao in CHAVES:
+                self._upsert(colecao, origem.carregar(colecao))
+            for chave, valor in origem.meta().items():
+                self.salvar_meta(chave, valor)
+            self.conexao.execute("INSERT INTO meta (chave, valor) VALUES ('migrado', '1')")
+
+    def carregar(self, colecao):
+        ordem = 'id' if colecao == 'pedidos' else 'rowid'
+        cursor = self.conexao.execute(f'SELECT dados FROM {colecao} ORDER BY {ordem}')
+        tipo = TIPOS_REGISTRO[colecao]
+        return [tipo.de_dict(json.loads(dados)) for (dados,) in cursor]
+
+    def particao_pendente(self):
+        # Sem partições mensais: não há como carregar só parte do histórico
+        return None
+
+    def carregar_em_partes(self, colecao, tamanho=None):
+        """Gera os registros em listas de até `tamanho` (padrão: `tamanho_parte`).
+
+        Pedidos vêm do id maior ao menor.
+        """
+        if colecao != 'pedidos':
+            yield self.carregar(colecao)
+            return
+        tamanho = tamanho or self.tamanho_parte
+        # Conexão própria: a leitura enxerga um retrato do banco (WAL) e não
+        # disputa a conexão usada pelas gravações
+        leitura = sqlite3.connect(self.arquivo)
+        try:
+            cursor = leitura.execute('SELECT dados FROM pedidos ORDER BY id DESC')
+            while True:
+                linhas = cursor.fetchmany(tamanho)
+                if not linhas:
+                    self._menor_id_carregado = 0
+                    return
+                parte = [Pedido.de_dict(json.loads(dados)) for (dados,) in linhas]
+                self._menor_id_carregado = parte[-1].id
+                yield [p for p in parte if p.id not in self._alterados_na_sessao]
+        finally:
+            leitura.close()
+
+    def pedidos_nao_carregados(self, ignorar=(), motoboy=None):
+        """Pedidos que a carga progressiva ainda não entregou, em ordem de data.
+
+        O limite é fixado na chamada; a consulta só roda quando o gerador
+        devolvido é consumido. `ignorar` são os ids já em memória; com
+        `motoboy`, só os pedidos dele.
+        """
+        return self._ler_pendentes(self._menor_id_carregado, set(ignorar), motoboy)
+
+    def motoboys_nao_carregados(self):
+        """Quantos pedidos de cada motoboy a carga progressiva ainda não entregou."""
+        limite = self._menor_id_carregado
+        leitura = sqlite3.connect(self.arquivo)
+        try:
+            return Counter(dict(leitura.execute(
+                'SELECT motoboy, COUNT(*) FROM pedidos WHERE (? IS NULL OR id < ?) AND motoboy IS NOT NULL '
+                'GROUP BY motoboy', (limite, limite))))
+        finally:
+            leitura.close()
+
+    def _ler_pendentes(self, limite, ignorar, motoboy=None):
+        # Conexão própria, como na carga: pode ser usada por outra thread
+        leitura = sqlite3.connect(self.arquivo)
+        try:
+            cursor = leitura.execute('SELECT dados FROM pedidos WHERE (? IS NULL OR id < ?) '
+                                     'AND (? IS NULL OR motoboy = ?) ORDER BY data, id',
+                                     (limite, limite, motoboy, motoboy))
+            while True:
+                linhas = cursor.fetchmany(self.tamanho_parte)
+                if not linhas:
+                    return
+                pedidos = [Pedido.de_dict(json.loads(dados)) for (dados,) in linhas]
+                yield [p for p in pedidos if p.id not in ignorar]
+        finally:
+            leitura.close()
+
+    def salvar(self, colecao, registros):
+        if colecao == 'pedidos':
+            self._alterados_na_sessao.update(r.id for r in registros)
+        with self.lote():
+            self._upsert(colecao, registros)
+
+    def remover(self, colecao, chaves):
+        if colecao == 'pedidos':
+            self._alterados_na_sessao.update(chaves)
+        with self.lote():
+            self.conexao.executemany(
+                f'DELETE FROM {colecao} WHERE {CHAVES[colecao]} = ?',
+                [(c,) for c in chaves])
+
+    def carregar_meta(self, chave, padrao=None):
+        linha = self.conexao.execute('SELECT valor FROM meta WHERE chave = ?', (chave,)).fetchone()
+        return json.loads(linha[0]) if linha else padrao
+
+    def salvar_meta(self, chave, valor):
+        with self.lote():
+            self.conexao.execute('INSERT OR REPLACE INTO meta (chave, valor) VALUES (?, ?)',
+                                 (chave, json.dumps(valor)))
+
+    @contextmanager
+    def lote(self):
+        """Executa as alterações de uma ação do usuário em uma única transação."""
+        self._profundidade += 1
+        try:
+            yield
+        except BaseException:
+            self._profundidade -= 1
+            # Nada da ação fica gravado pela metade
+            if not self._profundidade:
+                self.conexao.rollback()
+            raise
+        self._profundidade -= 1
+        if not self._profundidade:
+            self.conexao.commit()
+
+    def fechar(self):
+        self.conexao.close()
+
+    def _upsert(self, colecao, registros):
+        if colecao == 'pedidos':
+            self.conexao.executemany(
+                'INSERT OR REPLACE INTO pedidos (id, data, motoboy, dados) VALUES (?, ?, ?, ?)',
+                [(r.id, data_iso(r.data), r.motoboy,
+                  json.dumps(r.para_dict(), ensure_ascii=False)) for r in registros])
+        else:
+            self.conexao.executemany(
+                f'INSERT INTO {colecao} (nome, dados) VALUES (?, ?) '
+                'ON CONFLICT (nome) DO UPDATE SET dados = excluded.dados',
+                [(r.nome, json.dumps(r.para_dict(), ensure_ascii=False)) for r in registros])
+
+class Repositorio:
+    """Coleção em memória indexada pela chave do registro.
+
+    Mantém um dicionário pela chave exata e outro pela chave sem distinção de
+    maiúsculas/minúsculas (usado nos cadastros que atualizam pelo nome). A
+    ordem de iteração é a de inserção, como na lista original.
+    """
+
+    def __init__(self, registros, chave):
+        self.chave = chave
+        self._por_chave = {}
+        self._por_casefold = {}
+        for r in registros:
+            self.adicionar(r)
+
+    def __iter__(self):
+        return iter(self._por_chave.values())
+
+    def __len__(self):
+        return len(self._por_chave)
+
+    def __contains__(self, chave):
+        return chave in self._por_chave
+
+    def obter(self, chave, padrao=None):
+        return self._por_chave.get(chave, padrao)
+
+    def obter_casefold(self, chave, padrao=None):
+        return self._por_casefold.get(self._casefold(chave), padrao)
+
+    def adicionar(self, registro):
+        chave = getattr(registro, self.chave)
+        self._por_chave[chave] = registro
+        self._por_casefold[self._casefold(chave)] = registro
+
+    def adicionar_varios(self, registros):
+        for r in registros:
+            self.adicionar(r)
+
+    def remover(self, chave):
+        registro = self._por_chave.pop(chave, None)
+        if registro is not None:
+            self._por_casefold.pop(self._casefold(chave), None)
+        return registro
+
+    @staticmethod
+    def _casefold(chave):
+        return chave.casefold() if isinstance(chave, str) else chave
+
+class RepositorioOrdenado(Repositorio):
+    """Repositório que também mantém as chaves ordenadas, para paginação."""
+
+    def __init__(self, registros, chave):
+        self._chaves = []
+        super().__init__(registros, chave)
+
+    def adicionar(self, registro):
+        chave = getattr(registro, self.chave)
+        if chave not in self._por_chave:
+            if not self._chaves or chave > self._chaves[-1]:
+                self._chaves.append(chave)
+            else:
+                insort(self._chaves, chave)
+        super().adicionar(registro)
+
+    def adicionar_varios(self, registros):
+        # Uma ordenação por bloco em vez de um insort por registro (a carga
+        # do histórico chega do mais recente para o mais antigo)
+        novas = []
+        for r in registros:
+            chave = getattr(r, self.chave)
+            if chave not in self._por_chave:
+                novas.append(chave)
+            Repositorio.adicionar(self, r)
+        self._chaves.extend(novas)
+        self._chaves.sort()
+
+    def remover(self, chave):
+        registro = super().remover(chave)
+        if registro is not None:
+            del self._chaves[bisect_left(self._chaves, chave)]
+        return registro
+
+    def remover_varios(self, chaves):
+        """Remove várias chaves; retorna os registros removidos.
+
+        Muitas remoções reconstroem a lista ordenada em uma única passada, em
+        vez de um deslocamento da lista inteira por chave.
+        """
+        if len(chaves) < LIMITE_REMOCAO_INDIVIDUAL:
+            return [r for r in map(self.remover, chaves) if r is not None]
+        removidos = [r for r in (Repositorio.remover(self, c) for c in chaves) if r is not None]
+        excluidas = {getattr(r, self.chave) for r in removidos}
+        self._chaves = [c for c in self._chaves if c not in excluidas]
+        return removidos
+
+    def ultima_chave(self, padrao=None):
+        return self._chaves[-1] if self._chaves else padrao
+
+    def fatia(self, inicio, quantidade, decrescente=False):
+        """Retorna `quantidade` registros a partir da posição `inicio` na ordem das chaves."""
+        if decrescente:
+            fim = len(self._chaves) - inicio
+            chaves = reversed(self._chaves[max(fim - quantidade, 0):max(fim, 0)])
+        else:
+            chaves = self._chaves[inicio:inicio + quantidade]
+        return [self._por_chave[c] for c in chaves]
+
+class IndiceDatas:
+    """Pedidos ordenados por data/hora, para consultas por período com bisect."""
+
+    def __init__(self, pedidos=()):
+        self._datas = {p.id: converter_data(p.data) for p in pedidos}
+        self._entradas = sorted((data, pedido_id) for pedido_id, data in self._datas.items())
+
+    def adicionar(self, pedido):
+        data = converter_data(pedido.data)
+        self._datas[pedido.id] = data
+        entrada = (data, pedido.id)
+        if not self._entradas or entrada > self._entradas[-1]:
+            self._entradas.append(entrada)
+        else:
+            insort(self._entradas, entrada)
+
+    def adicionar_varios(self, pedidos):
+        for p in pedidos:
+            data = converter_data(p.data)
+            self._datas[p.id] = data
+            self._entradas.append((data, p.id))
+        self._entradas.sort()
+
+    def remover(self, pedido):
+        data = self._datas.pop(pedido.id, None)
+        if data is None:
+            return
+        posicao = bisect_left(self._entradas, (data, pedido.id))
+        del self._entradas[posicao]
+
+    def remover_varios(self, pedidos):
+        if len(pedidos) < LIMITE_REMOCAO_INDIVIDUAL:
+            for p in pedidos:
+                self.remover(p)
+            return
+        excluidos = {p.id for p in pedidos if self._datas.pop(p.id, None) is not None}
+        self._entradas = [e for e in self._entradas if e[1] not in excluidos]
+
+    def data(self, pedido_id):
+        return self._datas.get(pedido_id)
+
+    def ids_no_periodo(self, inicio=None, fim=None):
+        """Ids dos pedidos com inicio <= data < fim (limites None são abertos)."""
+        esquerda, direita = self._limites(inicio, fim)
+        return [pedido_id for _, pedido_id in self._entradas[esquerda:direita]]
+
+    def contar(self, inicio=None, fim=None):
+        esquerda, direita = self._limites(inicio, fim)
+        return direita - esquerda
+
+    def no_periodo(self, pedido_id, inicio=None, fim=None):
+        data = self._datas.get(pedido_id)
+        return data is not None and (not inicio or data >= inicio) and (not fim or data < fim)
+
+    def _limites(self, inicio, fim):
+        esquerda = bisect_left(self._entradas, (inicio,)) if inicio else 0
+        direita = bisect_left(self._entradas, (fim,)) if fim else len(self._entradas)
+        return esquerda, direita
+
+class IndicePrefixos:
+    """Nomes ordenados sem caixa, para sugerir enquanto o usuário digita.
+
+    Além do nome inteiro, guarda o trecho que começa em cada palavra seguinte
+    ("Coca Cola" também é achado por "cola"); a busca é um bisect até o início
+    do prefixo seguido da leitura de no máximo `limite` entradas.
+    """
+
+    def __init__(self, nomes=()):
+        self._nomes = []
+        self._palavras = []
+        for nome in nomes:
+            nome_casefold, trechos = self._chaves(nome)
+            self._nomes.append((nome_casefold, nome))
+            self._palavras.extend((trecho, nome) for trecho in trechos)
+        self._nomes.sort()
+        self._palavras.sort()
+
+    def adicionar(self, nome):
+        nome_casefold, trechos = self._chaves(nome)
+        insort(self._nomes, (nome_casefold, nome))
+        for trecho in trechos:
+            insort(self._palavras, (trecho, nome))
+
+    def remover(self, nome):
+        nome_casefold, trechos = self._chaves(nome)
+        self._descartar(self._nomes, (nome_casefold, nome))
+        for trecho in trechos:
+            self._descartar(self._palavras, (trecho, nome))
+
+    def buscar(self, texto, limite=20):
+        """Até `limite` nomes que começam por `texto` ou têm uma palavra que começa
+        por ele; os que começam pelo texto vêm primeiro, em ordem alfabética."""
+        prefixo = ' '.join(texto.casefold().split())
+        encontrados = []
+        for entradas in (self._nomes, self._palavras):
+            posicao = bisect_left(entradas, (prefixo,))
+            while posicao < len(entradas) and len(encontrados) < limite:
+                chave, nome = entradas[posicao]
+                if not chave.startswith(prefixo):
+                    break
+                if nome not in encontrados:
+                    encontrados.append(nome)
+                posicao += 1
+        return encontrados
+
+    @staticmethod
+    def _chaves(nome):
+        palavras = nome.casefold().split()
+        return ' '.join(palavras), [' '.join(palavras[i:]) for i in range(1, len(palavras))]
+
+    @staticmethod
+    def _descartar(entradas, entrada):
+        posicao = bisect_left(entradas, entrada)
+        if posicao < len(entradas) and entradas[posicao] == entrada:
+            del entradas[posicao]
+
+class IndiceMotoboys:
+    """Índice reverso: ids dos pedidos de cada motoboy.
+
+    Responde se um motoboy está em uso e quantos/quais pedidos ele tem sem
+    percorrer o histórico; a lista ordenada de ids só é refeita quando os
+    pedidos daquele motoboy mudam.
+    """
+
+    def __init__(self, pedidos=()):
+        self._ids = {}
+        self._ordenados = {}
+        self.adicionar_varios(pedidos)
+
+    def __contains__(self, nome):
+        return nome in self._ids
+
+    def adicionar(self, pedido):
+        self._ids.setdefault(pedido.motoboy, set()).add(pedido.id)
+        self._ordenados.pop(pedido.motoboy, None)
+
+    def adicionar_varios(self, pedidos):
+        for p in pedidos:
+            self.adicionar(p)
+
+    def remover(self, pedido):
+        ids = self._ids.get(pedido.motoboy)
+        if ids is None:
+            return
+        ids.discard(pedido.id)
+        if not ids:
+            del self._ids[pedido.motoboy]
+        self._ordenados.pop(pedido.motoboy, None)
+
+    def quantidade(self, nome):
+        return len(self._ids.get(nome, ()))
+
+    def ids(self, nome):
+        """Ids dos pedidos do motoboy, em ordem crescente."""
+        ordenados = self._ordenados.get(nome)
+        if ordenados is None:
+            ordenados = self._ordenados[nome] = sorted(self._ids.get(nome, ()))
+        return ordenados
+
+class ColunasPedidos:
+    """Campos numéricos dos pedidos em colunas (array), para agregações rápidas.
+
+    Há uma tabela de pedidos (data, canal, motoboy, total) e outra de itens
+    (data, produto, quantidade, total do item). Canal, produto e motoboy viram
+    códigos inteiros e a data vira minutos desde 1970. Com NumPy as colunas
+    são lidas sem cópia e agrupadas com bincount; sem NumPy o mesmo cálculo é
+    feito em um laço sobre as colunas. Uma exclusão move a última linha para
+    o lugar da removida.
+    """
+
+    EPOCA = datetime(1970, 1, 1).toordinal()
+
+    def __init__(self, pedidos=()):
+        self.ids = array('q')
+        self.minutos = array('q')
+        self.canais = array('i')
+        self.motoboys = array('i')
+        self.totais = array('d')
+        self.itens_pedido = array('q')
+        self.itens_minutos = array('q')
+        self.itens_produtos = array('i')
+        self.itens_quantidades = array('q')
+        self.itens_totais = array('d')
+        self._colunas = (self.ids, self.minutos, self.canais, self.motoboys, self.totais)
+        self._colunas_itens = (self.itens_pedido, self.itens_minutos, self.itens_produtos,
+                               self.itens_quantidades, self.itens_totais)
+        self._posicoes = {}
+        # Linha do item de cada pedido; uma tupla de linhas só para pedidos
+        # com mais de um item, que são minoria
+        self._posicoes_itens = {}
+        self._codigos = ({}, {}, {})
+        self._nomes = ([], [], [])
+        self.adicionar_varios(pedidos)
+
+    def __len__(self):
+        return len(self.ids)
+
+    def adicionar(self, pedido, data=None):
+        """`data` é a data do pedido já convertida, se houver (evita converter de novo)."""
+        self.adicionar_varios([pedido], [data or converter_data(pedido.data)])
+
+    def adicionar_varios(self, pedidos, datas=None):
+        # Uma passada por coluna (extend) em vez de vários appends por pedido
+        pedidos = list(pedidos)
+        if datas is None:
+            datas = [converter_data(p.data) for p in pedidos]
+        minutos = [self.minutos_desde_epoca(d) for d in datas]
+        ids = [-1 if p.id is None else p.id for p in pedidos]
+
+        self._posicoes.update(zip(ids, range(len(self.ids), len(self.ids) + len(pedidos))))
+        self.ids.extend(ids)
+        self.minutos.extend(minutos)
+        self.canais.extend(self._codigo(0, p.tipo) for p in pedidos)
+        self.motoboys.extend(self._codigo(2, p.motoboy) for p in pedidos)
+        self.totais.extend(p.total for p in pedidos)
+
+        linha = len(self.itens_pedido)
+        itens = []
+        for pedido_id, minuto, p in zip(ids, minutos, pedidos):
+            quantidade = len(p.itens)
+            self._posicoes_itens[pedido_id] = (
+                linha if quantidade == 1 else tuple(range(linha, linha + quantidade)))
+            linha += quantidade
+            itens.extend((pedido_id, minuto, item) for item in p.itens)
+        self.itens_pedido.extend(i[0] for i in itens)
+        self.itens_minutos.extend(i[1] for i in itens)
+        self.itens_produtos.extend(self._codigo(1, i[2].produto) for i in itens)
+        self.itens_quantidades.extend(i[2].quantidade for i in itens)
+        self.itens_totais.extend(i[2].total for i in itens)
+
+    def remover(self, pedido):
+        pedido_id = -1 if pedido.id is None else pedido.id
+        posicao = self._posicoes.pop(pedido_id, None)
+        if posicao is None:
+            return
+        movido = self._remover_linha(self._colunas, posicao)
+        if movido is not None:
+            self._posicoes[movido] = posicao
+
+        linhas = self._posicoes_itens.pop(pedido_id)
+        # Da maior para a menor: a última linha da tabela nunca é outro item deste pedido
+        for linha in sorted(linhas if isinstance(linhas, tuple) else (linhas,), reverse=True):
+            ultima = len(self.itens_pedido) - 1
+            movido = self._remover_linha(self._colunas_itens, linha)
+            if movido is not None:
+                atual = self._posicoes_itens[movido]
+                self._posicoes_itens[movido] = (
+                    linha if not isinstance(atual, tuple)
+                    else tuple(linha if l == ultima else l for l in atual))
+
+    def agregar(self, inicio=None, fim=None):
+        """Totais dos pedidos com inicio <= data < fim, agrupados por canal, motoboy e produto.
+
+        Retorna um dicionário com 'pedidos_por_canal', 'vendas_por_canal',
+        'entregas' ((canal, motoboy) -> quantidade, sem os pedidos da Loja),
+        'quantidade_por_produto' e 'vendas_por_produto'.
+        """
+        inicio = self.minutos_desde_epoca(inicio) if inicio else None
+        fim = self.minutos_desde_epoca(fim) if fim else None
+        if numpy is not None:
+            return self._agregar_numpy(inicio, fim)
+
+        def no_periodo(minuto):
+            return (inicio is None or minuto >= inicio) and (fim is None or minuto < fim)
+
+        canais, produtos, motoboys = self._nomes
+        pedidos_por_canal, vendas_por_canal, entregas = {}, {}, {}
+        for minuto, canal, motoboy, total in zip(self.minutos, self.canais, self.motoboys, self.totais):
+            if no_periodo(minuto):
+                pedidos_por_canal[canal] = pedidos_por_canal.get(canal, 0) + 1
+                vendas_por_canal[canal] = vendas_por_canal.get(canal, 0) + total
+                entregas[canal, motoboy] = entregas.get((canal, motoboy), 0) + 1
+        quantidade_por_produto, vendas_por_produto = {}, {}
+        for minuto, produto, quantidade, total in zip(
+                self.itens_minutos, self.itens_produtos, self.itens_quantidades, self.itens_totais):
+            if no_periodo(minuto):
+                quantidade_por_produto[produto] = quantidade_por_produto.get(produto, 0) + quantidade
+                vendas_por_produto[produto] = vendas_por_produto.get(produto, 0) + total
+        return {
+            'pedidos_por_canal': {canais[c]: n for c, n in pedidos_por_canal.items()},
+            'vendas_por_canal': {canais[c]: v for c, v in vendas_por_canal.items()},
+            'entregas': {(canais[c], motoboys[m]): n for (c, m), n in entregas.items()
+                         if canais[c] != 'Loja'},
+            'quantidade_por_produto': {produtos[p]: q for p, q in quantidade_por_produto.items()},
+            'vendas_por_produto': {produtos[p]: v for p, v in vendas_por_produto.items()}
+        }
+
+    def _agregar_numpy(self, inicio, fim):
+        canais, produtos, motoboys = self._nomes
+        # Visões sem cópia sobre os buffers dos arrays; saem de escopo ao
+        # retornar, antes que as colunas precisem crescer de novo
+        canal, motoboy, total = self._filtrar_numpy(
+            self.minutos, inicio, fim,
+            (self.canais, numpy.int32), (self.motoboys, numpy.int32), (self.totais, numpy.float64))
+        produto, quantidade, total_item = self._filtrar_numpy(
+            self.itens_minutos, inicio, fim, (self.itens_produtos, numpy.int32),
+            (self.itens_quantidades, numpy.int64), (self.itens_totais, numpy.float64))
+
+        pedidos_por_canal = numpy.bincount(canal, minlength=len(canais)).tolist()
+        vendas_por_canal = numpy.bincount(canal, weights=total, minlength=len(canais)).tolist()
+        pares = numpy.bincount(canal.astype(numpy.int64) * len(motoboys) + motoboy,
+                               minlength=len(canais) * len(motoboys)).tolist()
+        itens_por_produto = numpy.bincount(produto, minlength=len(produtos)).tolist()
+        quantidade_por_produto = numpy.bincount(produto, weights=quantidade, minlength=len(produtos)).tolist()
+        vendas_por_produto = numpy.bincount(produto, weights=total_item, minlength=len(produtos)).tolist()
+        return {
+            'pedidos_por_canal': {canais[c]: n for c, n in enumerate(pedidos_por_canal) if n},
+            'vendas_por_canal': {canais[c]: v for c, v in enumerate(vendas_por_canal)
+                                 if pedidos_por_canal[c]},
+            'entregas': {(canais[i // len(motoboys)], motoboys[i % len(motoboys)]): n
+                         for i, n in enumerate(pares)
+                         if n and canais[i // len(motoboys)] != 'Loja'},
+            'quantidade_por_produto': {produtos[p]: int(quantidade_por_produto[p])
+                                       for p, n in enumerate(itens_por_produto) if n},
+            'vendas_por_produto': {produtos[p]: vendas_por_produto[p]
+                                   for p, n in enumerate(itens_por_produto) if n}
+        }
+
+    @staticmethod
+    def _filtrar_numpy(minutos, inicio, fim, *colunas):
+        colunas = [numpy.frombuffer(c, dtype=tipo) for c, tipo in colunas]
+        if inicio is None and fim is None:
+            return colunas
+        minutos = numpy.frombuffer(minutos, dtype=numpy.int64)
+        filtro = numpy.ones(len(minutos), dtype=bool)
+        if inicio is not None:
+            filtro &= minutos >= inicio
+        if fim is not None:
+            filtro &= minutos < fim
+        return [c[filtro] for c in colunas]
+
+    @classmethod
+    def minutos_desde_epoca(cls, data):
+        return (data.toordinal() - cls.EPOCA) * 1440 + data.hour * 60 + data.minute
+
+    @staticmethod
+    def _remover_linha(colunas, posicao):
+        """Move a última linha para `posicao`; retorna o id do pedido movido (ou None)."""
+        ultima = len(colunas[0]) - 1
+        movido = colunas[0][ultima] if posicao != ultima else None
+        for coluna in colunas:
+            coluna[posicao] = coluna[ultima]
+            coluna.pop()
+        return movido
+
+    def _codigo(self, coluna, nome):
+        codigos = self._codigos[coluna]
+        codigo = codigos.get(nome)
+        if codigo is None:
+            codigo = codigos[nome] = len(self._nomes[coluna])
+            self._nomes[coluna].append(nome)
+        return codigo
+
+class ResumoFinanceiro:
+    """Totais financeiros mantidos incrementalmente a cada pedido.
+
+    O custo de uma entrega é o valor por entrega atual do motoboy, como no
+    cálculo completo; por isso as entregas são contadas por (canal, motoboy)
+    e o custo é reajustado quando o valor de um motoboy muda.
+    """
+
+    def __init__(self, pedidos=(), motoboys=()):
+        self.total_vendas = 0.0
+        self.total_motoboys = 0.0
+        self.vendas_por_canal = {}
+        self.pedidos_por_canal = {}
+        self.custo_por_canal = {}
+        self.entregas = {}
+        self.valores = {}
+        for m in motoboys:
+            self.definir_motoboy(m.nome, m.valor_por_entrega)
+        for p in pedidos:
+            self.adicionar(p)
+
+    @classmethod
+    def de_agregados(cls, agregados, motoboys=()):
+        """Monta o resumo a partir de ColunasPedidos.agregar, sem percorrer os pedidos."""
+        resumo = cls(motoboys=motoboys)
+        resumo.pedidos_por_canal = dict(agregados['pedidos_por_canal'])
+        resumo.vendas_por_canal = dict(agregados['vendas_por_canal'])
+        resumo.total_vendas = sum(resumo.vendas_por_canal.values())
+        resumo.entregas = dict(agregados['entregas'])
+        for (canal, nome), quantidade in resumo.entregas.items():
+            custo = quantidade * resumo.valores.get(nome, 0)
+            resumo.total_motoboys += custo
+            resumo.custo_por_canal[canal] = resumo.custo_por_canal.get(canal, 0) + custo
+        return resumo
+
+    @property
+    def lucro(self):
+        return self.total_vendas - self.total_motoboys
+
+    def adicionar(self, pedido):
+        self._aplicar(pedido, 1)
+
+    def remover(self, pedido):
+        self._aplicar(pedido, -1)
+
+    def definir_motoboy(self, nome, valor):
+        diferenca = valor - self.valores.get(nome, 0)
+        self.valores[nome] = valor
+        self._ajustar_custo(nome, diferenca)
+
+    def remover_motoboy(self, nome):
+        self._ajustar_custo(nome, -self.valores.pop(nome, 0))
+
+    def copia(self):
+        """Cópia independente, que pode receber pedidos sem alterar este resumo."""
+        resumo = copy(self)
+        for campo in ('vendas_por_canal', 'pedidos_por_canal', 'custo_por_canal', 'entregas', 'valores'):
+            setattr(resumo, campo, dict(getattr(self, campo)))
+        return resumo
+
+    def entregas_por_motoboy(self):
+        por_motoboy = {}
+        for (_, motoboy), quantidade in self.entregas.items():
+            por_motoboy[motoboy] = por_motoboy.get(motoboy, 0) + quantidade
+        return por_motoboy
+
+    def _aplicar(self, pedido, sinal):
+        canal = pedido.tipo
+        total = sinal * pedido.total
+        self.total_vendas += total
+        self.vendas_por_canal[canal] = self.vendas_por_canal.get(canal, 0) + total
+        self.pedidos_por_canal[canal] = self.pedidos_por_canal.get(canal, 0) + sinal
+        if canal == 'Loja':
+            return
+
+        chave = (canal, pedido.motoboy)
+        self.entregas[chave] = self.entregas.get(chave, 0) + sinal
+        if not self.entregas[chave]:
+            del self.entregas[chave]
+        custo = sinal * self.valores.get(pedido.motoboy, 0)
+        self.total_motoboys += custo
+        self.custo_por_canal[canal] = self.custo_por_canal.get(canal, 0) + custo
+
+    def _ajustar_custo(self, nome, diferenca):
+        for canal in list(self.custo_por_canal):
+            custo = self.entregas.get((canal, nome), 0) * diferenca
+            self.total_motoboys += custo
+            self.custo_por_canal[canal] += custo
+
+class PersistenceWorker:
+    """Executa as gravações de um backend em uma thread separada.
+
+    Expõe a mesma interface do backend (carregar/salvar/remover/lote), mas
+    salvar e remover apenas copiam os registros e enfileiram a operação.
+    O resultado de cada lote fica em `resultados` até que a thread do Tk o
+    consuma com `processar_resultados`.
+    """
+
+    def __init__(self, backend, ao_concluir=None, ao_falhar=None):
+        self.backend = backend
+        self.ao_concluir = ao_concluir
+        self.ao_falhar = ao_falhar
+        self.fila = queue.Queue()
+        self.resultados = queue.Queue()
+        self._profundidade = 0
+        self._operacoes = []
+        self.thread = threading.Thread(target=self._executar, name='persistencia', daemon=True)
+        self.thread.start()
+
+    def carregar(self, colecao):
+        return self.backend.carregar(colecao)
+
+    def carregar_em_partes(self, colecao, tamanho=None):
+        return self.backend.carregar_em_partes(colecao, tamanho)
+
+    @property
+    def particionado(self):
+        return self.backend.particionado
+
+    def particao_pendente(self):
+        return self.backend.particao_pendente()
+
+    def pedidos_nao_carregados(self, ignorar=(), motoboy=None):
+        return self.backend.pedidos_nao_carregados(ignorar, motoboy)
+
+    def motoboys_nao_carregados(self):
+        return self.backend.motoboys_nao_carregados()
+
+    def salvar(self, colecao, registros):
+        self._operacoes.append(('salvar', colecao, [copy(r) for r in registros]))
+        self._enviar_se_livre()
+
+    def remover(self, colecao, chaves):
+        self._operacoes.append(('remover', colecao, list(chaves)))
+        self._enviar_se_livre()
+
+    def carregar_meta(self, chave, padrao=None):
+        return self.backend.carregar_meta(chave, padrao)
+
+    def salvar_meta(self, chave, valor):
+        self._operacoes.append(('salvar_meta', chave, valor))
+        self._enviar_se_livre()
+
+    @contextmanager
+    def lote(self):
+        self._profundidade += 1
+        try:
+            yield
+        finally:
+            self._profundidade -= 1
+            self._enviar_se_livre()
+
+    def aguardar(self):
+        """Bloqueia até que todas as gravações enfileiradas terminem."""
+        self.fila.join()
+
+    def processar_resultados(self):
+        """Dispara os callbacks pendentes; deve ser chamado na thread do Tk."""
+        while True:
+            try:
+                callback, argumento = self.resultados.get_nowait()
+            except queue.Empty:
+                return
+            if callback:
+                callback(argumento)
+
+    def fechar(self):
+        self._enviar_se_livre()
+        self.fila.put(None)
+        self.thread.join()
+        self.backend.fechar()
+
+    def _enviar_se_livre(self):
+        if self._profundidade or not self._operacoes:
+            return
+        operacoes, self._operacoes = self._operacoes, []
+        self.fila.put(operacoes)
+
+    def _executar(self):
+        while True:
+            operacoes = self.fila.get()
+            try:
+                if operacoes is None:
+                    return
+                with self.backend.lote():
+                    for metodo, colecao, dados in operacoes:
+                        getattr(self.backend, metodo)(colecao, dados)
+            except Exception as erro:
+                self.resultados.put((self.ao_falhar, erro))
+            else:
+                self.resultados.put((self.ao_concluir, len(operacoes)))
+            finally:
+                self.fila.task_done()
+
+BACKENDS = {
+    'json': JsonBackend,
+    'sqlite': SQLiteBackend
+}
+
+def criar_backend(nome=BACKEND):
+    if nome not in BACKENDS:
+        raise ValueError(f"Backend de armazenamento desconhecido: {nome}")
+    return BACKENDS[nome]()
+
+@lru_cache(maxsize=4096)
+def converter_data(data):
+    """Converte a data gravada no pedido; datas inválidas vão para o início."""
+    try:
+        # Atalho para o formato gravado pelo Control ('dd/mm/aaaa HH:MM'),
+        # bem mais rápido que strptime na carga de históricos grandes
+        if len(data) == 16 and data[2] == data[5] == '/' and data[10] == ' ' and data[13] == ':':
+            return datetime(int(data[6:10]), int(data[3:5]), int(data[0:2]),
+                            int(data[11:13]), int(data[14:16]))
+        return datetime.strptime(data, FORMATO_DATA)
+    except (TypeError, ValueError):
+        return datetime.min
+
+def intervalo_periodo(periodo, agora=None, inicio=None, fim=None):
+    """Retorna (inicio, fim) do período; fim é exclusivo e None significa aberto."""
+    agora = agora or datetime.now()
+    hoje = agora.replace(hour=0, minute=0, second=0, microsecond=0)
+    if periodo == 'Hoje':
+        return hoje, hoje + timedelta(days=1)
+    if periodo == 'Semana':
+        segunda = hoje - timedelta(days=hoje.weekday())
+        return segunda, segunda + timedelta(days=7)
+    if periodo == 'Mês':
+        primeiro = hoje.replace(day=1)
+        return primeiro, (primeiro + timedelta(days=32)).replace(day=1)
+    if periodo == 'Personalizado':
+        return inicio, fim + timedelta(days=1) if fim else None
+    return None, None
+
+def data_iso(data):
+    """Converte 'dd/mm/aaaa HH:MM' para 'aaaa-mm-dd HH:MM' (ordenável)."""
+    try:
+        return datetime.strptime(data, "%d/%m/%Y %H:%M").strftime("%Y-%m-%d %H:%M")
+    except (TypeError, ValueError):
+        return None
+
+
+class ErroValidacao(ValueError):
+    """Operação recusada por uma regra de negócio; a mensagem é exibível ao usuário."""
+
+class ProductService:
+    def __init__(self, produtos, backend):
+        self.produtos = produtos
+        self.backend = backend
+        self.indice_nomes = IndicePrefixos(p.nome for p in produtos)
+
+    def buscar(self, texto, limite=20):
+        """Produtos sugeridos para o texto digitado (veja IndicePrefixos.buscar)."""
+        return [self.produtos.obter(nome) for nome in self.indice_nomes.buscar(texto, limite)]
+
+    def salvar(self, nome, quantidade, preco):
+        """Cadastra o produto ou atualiza o existente com o mesmo nome (sem caixa)."""
+        return self.salvar_varios([(nome, quantidade, preco)])[0]
+
+    def validar(self, nome, quantidade, preco):
+        if not nome:
+            raise ErroValidacao("Preencha todos os campos.")
+        if quantidade < 0 or preco < 0:
+            raise ErroValidacao("Valores inválidos.")
+
+    def salvar_varios(self, registros):
+        """Cadastra/atualiza vários (nome, quantidade, preco) com uma única gravação."""
+        registros = list(registros)
+        for registro in registros:
+            self.validar(*registro)
+
+        salvos = {}
+        for nome, quantidade, preco in registros:
+            produto = self.produtos.obter_casefold(nome)
+            if produto:
+                produto.quantidade, produto.preco = quantidade, preco
+            else:
+                produto = Produto(nome, quantidade, preco)
+                self.produtos.adicionar(produto)
+                self.indice_nomes.adicionar(nome)
+            salvos[produto.nome] = produto
+
+        self.backend.salvar('produtos', list(salvos.values()))
+        return [self.produtos.obter_casefold(nome) for nome, _, _ in registros]
+
+    def excluir(self, nomes):
+        removidos = [nome for nome in nomes if self.produtos.remover(nome)]
+        for nome in removidos:
+            self.indice_nomes.remover(nome)
+        self.backend.remover('produtos', removidos)
+        return removidos
+
+class CourierService:
+    def __init__(self, motoboys, indice_motoboys, financas, backend):
+        self.motoboys = motoboys
+        self.indice_motoboys = indice_motoboys
+        self.financas = financas
+        self.backend = backend
+
+    def salvar(self, nome, valor_por_entrega):
+        """Cadastra o motoboy ou atualiza o valor do existente com o mesmo nome (sem caixa)."""
+        if not nome:
+            raise ErroValidacao("Preencha todos os campos.")
+        if valor_por_entrega < 0:
+            raise ErroValidacao("Valor inválido.")
+
+        motoboy = self.motoboys.obter_casefold(nome)
+        if motoboy:
+            motoboy.valor_por_entrega = valor_por_entrega
+        else:
+            motoboy = Motoboy(nome, valor_por_entrega)
+            self.motoboys.adicionar(motoboy)
+
+        self.financas.resumo.definir_motoboy(motoboy.nome, valor_por_entrega)
+        self.backend.salvar('motoboys', [motoboy])
+        return motoboy
+
+    def em_uso(self, nome):
+        """Se algum pedido, carregado ou não, é do motoboy.
+
+        Com a carga incompleta, os meses pendentes só são lidos quando o
+        backend conta pedidos do motoboy neles, e apenas esses meses.
+        """
+        if nome in self.indice_motoboys:
+            return True
+        if not self.backend.motoboys_nao_carregados().get(nome):
+            return False
+        # A contagem pode incluir pedidos já excluídos: confirma lendo os pedidos
+        return any(self.backend.pedidos_nao_carregados(motoboy=nome))
+
+    def excluir(self, nomes):
+        em_uso = [nome for nome in nomes if self.em_uso(nome)]
+        if em_uso:
+            raise ErroValidacao(
+                f"Os seguintes motoboys estão em pedidos e não podem ser excluídos: {', '.join(em_uso)}")
+
+        removidos = [nome for nome in nomes if self.motoboys.remover(nome)]
+        for nome in removidos:
+            self.financas.resumo.remover_motoboy(nome)
+        self.backend.remover('motoboys', removidos)
+        return removidos
+
+class OrderService:
+    def __init__(self, pedidos, produtos, motoboys, indice_datas, indice_motoboys, financas, backend):
+        self.pedidos = pedidos
+        self.produtos = produtos
+        self.motoboys = motoboys
+        self.indice_datas = indice_datas
+        self.indice_motoboys = indice_motoboys
+        self.financas = financas
+        self.backend = backend
+
+        # Sequência de ids: carregada uma vez, nunca reaproveita ids excluídos
+        self.ultimo_id = max(backend.carregar_meta('ultimo_id_pedido', 0),
+                             pedidos.ultima_chave(0))
+
+    def criar(self, cliente, tipo, itens, motoboy=None, data=None):
+        """Registra o pedido, baixa o estoque e grava tudo em um único lote.
+
+        `itens` é uma lista de pares (produto, quantidade). Todas as linhas são
+        validadas, e o estoque conferido para o pedido inteiro, antes de
+        qualquer alteração.
+        """
+        return self.registrar([self.validar(cliente, tipo, itens, motoboy, data)])[0]
+
+    def validar(self, cliente, tipo, itens, motoboy=None, data=None, reservado=None):
+        """Confere o pedido sem alterar nada e o devolve montado, ainda sem id.
+
+        Cada item pode trazer um terceiro valor, o preço unitário (pedidos
+        históricos importados). `reservado` acumula o estoque já comprometido
+        por outros pedidos validados antes de um `registrar` conjunto.
+        """
+        reservado = {} if reservado is None else reservado
+        # O tipo vem antes: a exigência de motoboy depende dele
+        if tipo not in TIPOS_PEDIDO:
+            raise ErroValidacao(f"Tipo de pedido inválido: {tipo}")
+        # Motoboy só é obrigatório para iFood e Robô
+        motoboy = motoboy if tipo != 'Loja' else None
+        if tipo != 'Loja' and not motoboy:
+            raise ErroValidacao("Selecione um motoboy para este tipo de pedido.")
+        itens = [tuple(item) for item in itens]
+        if not cliente or not itens or not all(item[0] and item[1] for item in itens):
+            raise ErroValidacao("Preencha todos os campos obrigatórios.")
+        if any(item[1] <= 0 for item in itens):
+            raise ErroValidacao("Quantidade inválida.")
+
+        # O mesmo produto pode aparecer em mais de uma linha
+        necessario = {}
+        for produto, quantidade, *_ in itens:
+            necessario[produto] = necessario.get(produto, 0) + quantidade
+        produtos = {}
+        for nome in necessario:
+            produtos[nome] = self.produtos.obter(nome)
+            if not produtos[nome]:
+                raise ErroValidacao("Produto não encontrado." if len(necessario) == 1
+                                    else f"Produto não encontrado: {nome}")
+        faltando = [p for nome, p in produtos.items()
+                    if p.quantidade - reservado.get(nome, 0) < necessario[nome]]
+        if len(necessario) == 1 and faltando:
+            raise ErroValidacao(
+                f"Estoque insuficiente. Disponível: {faltando[0].quantidade - reservado.get(faltando[0].nome, 0)}")
+        if faltando:
+            raise ErroValidacao("Estoque insuficiente. Disponível: " + ", ".join(
+                f"{p.nome}: {p.quantidade - reservado.get(p.nome, 0)}" for p in faltando))
+        if motoboy and not self.motoboys.obter(motoboy):
+            raise ErroValidacao("Motoboy não encontrado.")
+
+        linhas = []
+        for produto, quantidade, *preco in itens:
+            if preco:
+                preco = preco[0]
+            else:
+                # Calcula preço (com taxa para iFood)
+                preco = produtos[produto].preco
+                if tipo == 'iFood':
+                    preco = round(preco * (1 + PERCENTUAL_IFOOD), 2)
+            linhas.append(ItemPedido(produto, quantidade, preco))
+        for nome, quantidade in necessario.items():
+            reservado[nome] = reservado.get(nome, 0) + quantidade
+
+        return Pedido(
+            id=None,
+            cliente=cliente,
+            data=data or datetime.now().strftime(FORMATO_DATA),
+            tipo=tipo,
+            itens=linhas,
+            motoboy=motoboy if motoboy else "Retirada na Loja",
+            total=sum(i.total for i in linhas)
+        )
+
+    def registrar(self, pedidos):
+        """Registra pedidos devolvidos por `validar`: numera, baixa o estoque e grava em um único lote."""
+        produtos = {}
+        for pedido in pedidos:
+            self.ultimo_id += 1
+            pedido.id = self.ultimo_id
+            for item in pedido.itens:
+                produto = produtos[item.produto] = self.produtos.obter(item.produto)
+                produto.quantidade -= item.quantidade
+        if len(pedidos) == 1:
+            self._incluir(pedidos[0])
+        else:
+            self.incorporar(pedidos)
+
+        with self.backend.lote():
+            self.backend.salvar('produtos', list(produtos.values()))
+            self.backend.salvar('pedidos', pedidos)
+            self.backend.salvar_meta('ultimo_id_pedido', self.ultimo_id)
+        return pedidos
+
+    def excluir(self, ids):
+        """Remove os pedidos devolvendo o estoque; retorna os pedidos removidos."""
+        removidos = self._retirar(ids)
+
+        produtos_atualizados = {}
+        for pedido in removidos:
+            for item in pedido.itens:
+                produto = self.produtos.obter(item.produto)
+                if produto:
+                    produto.quantidade += item.quantidade
+                    produtos_atualizados[produto.nome] = produto
+
+        with self.backend.lote():
+            self.backend.salvar('produtos', list(produtos_atualizados.values()))
+            self.backend.remover('pedidos', [p.id for p in removidos])
+        return removidos
+
+    def ids_do_motoboy(self, nome):
+        """Ids dos pedidos do motoboy, em ordem crescente."""
+        return self.indice_motoboys.ids(nome)
+
+    def entregas(self, nome, inicio=None, fim=None):
+        """Quantos pedidos do motoboy têm inicio <= data < fim.
+
+        Percorre o menor dos dois conjuntos: os pedidos do motoboy ou os do período.
+        """
+        if inicio is None and fim is None:
+            return self.indice_motoboys.quantidade(nome)
+        if self.indice_datas.contar(inicio, fim) < self.indice_motoboys.quantidade(nome):
+            return sum(1 for i in self.indice_datas.ids_no_periodo(inicio, fim)
+                       if self.pedidos.obter(i).motoboy == nome)
+        return sum(1 for i in self.indice_motoboys.ids(nome)
+                   if self.indice_datas.no_periodo(i, inicio, fim))
+
+    def incorporar(self, pedidos):
+        """Inclui pedidos já gravados (carga do histórico) sem persistir nada."""
+        self.pedidos.adicionar_varios(pedidos)
+        self.indice_datas.adicionar_varios(pedidos)
+        self.indice_motoboys.adicionar_varios(pedidos)
+        for p in pedidos:
+            self.financas.resumo.adicionar(p)
+        if self.financas.colunas is not None:
+            self.financas.colunas.adicionar_varios(
+                pedidos, [self.indice_datas.data(p.id) for p in pedidos])
+        self.ultimo_id = max(self.ultimo_id, self.pedidos.ultima_chave(0))
+
+    def _incluir(self, pedido):
+        self.pedidos.adicionar(pedido)
+        self.indice_datas.adicionar(pedido)
+        self.indice_motoboys.adicionar(pedido)
+        self.financas.resumo.adicionar(pedido)
+        if self.financas.colunas is not None:
+            self.financas.colunas.adicionar(pedido, self.indice_datas.data(pedido.id))
+
+    def _retirar(self, ids):
+        removidos = self.pedidos.remover_varios(list(ids))
+        self.indice_datas.remover_varios(removidos)
+        for pedido in removidos:
+            self.indice_motoboys.remover(pedido)
+            self.financas.resumo.remover(pedido)
+            if self.financas.colunas is not None:
+                self.financas.colunas.remover(pedido)
+        return removidos
+
+class FinanceService:
+    """Resumos financeiros; com `colunas` (ColunasPedidos) os totais por
+    período, canal, motoboy e produto saem de agregações sobre as colunas."""
+
+    def __init__(self, pedidos, motoboys, indice_datas, colunas=None):
+        self.pedidos = pedidos
+        self.motoboys = motoboys
+        self.indice_datas = indice_datas
+        self.colunas = colunas
+        self.resumo = ResumoFinanceiro(pedidos, motoboys)
+
+    def resumo_periodo(self, periodo='Tudo', inicio=None, fim=None):
+        """Resumo de um dos PERIODOS; 'Personalizado' usa as datas informadas."""
+        if periodo == 'Tudo':
+            return self.resumo
+        inicio, fim = intervalo_periodo(periodo, inicio=inicio, fim=fim)
+        if self._usar_colunas(inicio, fim):
+            return ResumoFinanceiro.de_agregados(self.colunas.agregar(inicio, fim), self.motoboys)
+        ids = self.indice_datas.ids_no_periodo(inicio, fim)
+        return ResumoFinanceiro((self.pedidos.obter(i) for i in ids), self.motoboys)
+
+    def totais_por_produto(self, periodo='Tudo', inicio=None, fim=None):
+        """Quantidade vendida e total de vendas de cada produto: {nome: (quantidade, vendas)}."""
+        inicio, fim = intervalo_periodo(periodo, inicio=inicio, fim=fim)
+        if self._usar_colunas(inicio, fim):
+            agregados = self.colunas.agregar(inicio, fim)
+            return {nome: (quantidade, agregados['vendas_por_produto'][nome])
+                    for nome, quantidade in agregados['quantidade_por_produto'].items()}
+
+        totais = {}
+        pedidos = (self.pedidos.obter(i) for i in self.indice_datas.ids_no_periodo(inicio, fim))
+        for p in pedidos:
+            for item in p.itens:
+                quantidade, vendas = totais.get(item.produto, (0, 0))
+                totais[item.produto] = (quantidade + item.quantidade, vendas + item.total)
+        return totais
+
+    def recalcular(self):
+        """Recalcula tudo a partir dos pedidos; retorna True se os totais mantidos divergiam."""
+        if self.colunas is not None:
+            # As colunas também são mantidas aos poucos: a conferência usa
+            # colunas refeitas do zero a partir dos pedidos
+            colunas = ColunasPedidos(self.pedidos)
+            novo = ResumoFinanceiro.de_agregados(colunas.agregar(), self.motoboys)
+            mantido = ResumoFinanceiro.de_agregados(self.colunas.agregar(), self.motoboys)
+            divergiu = (len(self.colunas) != len(self.pedidos)
+                        or self._divergem(novo, self.resumo)
+                        or self._divergem(novo, mantido))
+            self.colunas = colunas
+            self.resumo = novo
+            return divergiu
+
+        total_vendas = sum(p.total for p in self.pedidos)
+
+        total_motoboys = 0
+        for p in self.pedidos:
+            if p.tipo != 'Loja':
+                motoboy = self.motoboys.obter(p.motoboy)
+                if motoboy:
+                    total_motoboys += motoboy.valor_por_entrega
+
+        divergiu = (abs(total_vendas - self.resumo.total_vendas) > 0.005
+                    or abs(total_motoboys - self.resumo.total_motoboys) > 0.005)
+        self.resumo = ResumoFinanceiro(self.pedidos, self.motoboys)
+        return divergiu
+
+    @staticmethod
+    def _divergem(a, b):
+        return (abs(a.total_vendas - b.total_vendas) > 0.005
+                or abs(a.total_motoboys - b.total_motoboys) > 0.005
+                or {c: n for c, n in a.pedidos_por_canal.items() if n}
+                != {c: n for c, n in b.pedidos_por_canal.items() if n})
+
+    def _usar_colunas(self, inicio, fim):
+        # Sem NumPy, um período curto sai mais barato pelo índice de datas do
+        # que varrendo todas as linhas das colunas
+        return self.colunas is not None and (numpy is not None or (inicio is None and fim is None))
+
+class ImportService:
+    """Importação em lote de produtos e pedidos a partir de CSV ou JSON-lines.
+
+    O arquivo é lido e validado em uma única passada; se alguma linha for
+    recusada nada é alterado e o erro lista as linhas problemáticas. Do
+    contrário todas as alterações (inclusive a baixa de estoque dos pedidos)
+    são aplicadas em memória e gravadas de uma vez.
+    """
+
+    def __init__(self, servico_produtos, servico_pedidos):
+        self.servico_produtos = servico_produtos
+        self.servico_pedidos = servico_pedidos
+
+    def importar_produtos(self, arquivo):
+        """Cadastra/atualiza produtos (colunas nome, quantidade, preco); retorna quantos."""
+        registros, erros = [], []
+        for linha, dados in self.ler(arquivo, erros):
+            try:
+                registro = (str(dados.get('nome') or '').strip(),
+                            self._numero(dados, 'quantidade', int),
+                            self._numero(dados, 'preco', float))
+                self.servico_produtos.validar(*registro)
+            except ErroValidacao as e:
+                erros.append((linha, str(e)))
+            else:
+                registros.append(registro)
+        self._verificar(erros, registros)
+        return len(self.servico_produtos.salvar_varios(registros))
+
+    def importar_pedidos(self, arquivo):
+        """Registra pedidos (históricos ou não) e baixa o estoque; retorna quantos.
+
+        Cada linha traz cliente, tipo, produto, quantidade e, opcionalmente,
+        data, motoboy e preco_unitario. Linhas seguidas com o mesmo valor na
+        coluna `pedido` formam um único pedido com vários itens; no JSON-lines
+        os itens também podem vir em uma lista `itens`.
+        """
+        pedidos, erros, reservado = [], [], {}
+        for linha, dados, itens in self._agrupar_pedidos(self.ler(arquivo, erros), erros):
+            try:
+                data = str(dados.get('data') or '').strip() or None
+                if data:
+                    try:
+                        datetime.strptime(data, FORMATO_DATA)
+                    except ValueError:
+                        raise ErroValidacao(f"Data inválida: {data}") from None
+                pedidos.append(self.servico_pedidos.validar(
+                    str(dados.get('cliente') or '').strip(),
+                    str(dados.get('tipo') or '').strip(),
+                    [self._item(item) for item in itens],
+                    str(dados.get('motoboy') or '').strip() or None,
+                    data,
+                    reservado))
+            except ErroValidacao as e:
+                erros.append((linha, str(e)))
+        self._verificar(erros, pedidos)
+        # Os ids são novos e seguem a data, não a ordem do arquivo: um histórico
+        # importado não aparece como os pedidos mais recentes
+        pedidos.sort(key=lambda p: converter_data(p.data))
+        return len(self.servico_pedidos.registrar(pedidos))
+
+    @staticmethod
+    def ler(arquivo, erros):
+        """Gera (número da linha, dicionário) sem carregar o arquivo inteiro.
+
+        Arquivos .csv precisam de cabeçalho (separador vírgula, ponto e vírgula
+        ou tabulação); os demais são lidos como JSON-lines. Linhas ilegíveis
+        vão para `erros` como (linha, mensagem).
+        """
+        if arquivo.lower().endswith('.csv'):
+            with open(arquivo, newline='', encoding='utf-8-sig') as f:
+                try:
+                    dialeto = csv.Sniffer().sniff(f.read(4096), delimiters=',;\t')
+                except csv.Error:
+                    dialeto = csv.excel
+                f.seek(0)
+                leitor = csv.DictReader(f, dialect=dialeto)
+                if leitor.fieldnames:
+                    leitor.fieldnames = [nome.strip().lower() for nome in leitor.fieldnames]
+                for dados in leitor:
+                    yield leitor.line_num, dados
+            return
+
+        with open(arquivo, encoding='utf-8-sig') as f:
+            for linha, texto in enumerate(f, start=1):
+                if not texto.strip():
+                    continue
+                try:
+                    dados = json.loads(texto)
+                except ValueError as e:
+                    erros.append((linha, f"JSON inválido ({e})"))
+                    continue
+                if not isinstance(dados, dict):
+                    erros.append((linha, "esperado um objeto JSON"))
+                    continue
+                yield linha, {chave.lower(): valor for chave, valor in dados.items()}
+
+    @staticmethod
+    def _agrupar_pedidos(linhas, erros):
+        # Junta linhas consecutivas do mesmo `pedido` em (linha, dados, itens)
+        atual = None
+        for linha, dados in linhas:
+            itens = dados.get('itens')
+            if itens is not None and not isinstance(itens, list):
+                erros.append((linha, "'itens' deve ser uma lista"))
+                continue
+            chave = str(dados.get('pedido') or '').strip()
+            if atual and chave and chave == atual[3]:
+                atual[2].extend(itens if itens is not None else [dados])
+                continue
+            if atual:
+                yield atual[:3]
+            atual = (linha, dados, list(itens) if itens is not None else [dados], chave)
+        if atual:
+            yield atual[:3]
+
+    def _item(self, dados):
+        if not isinstance(dados, dict):
+            raise ErroValidacao("Item inválido.")
+        item = (str(dados.get('produto') or '').strip(), self._numero(dados, 'quantidade', int))
+        preco = self._numero(dados, 'preco_unitario', float, obrigatorio=False)
+        return item if preco is None else item + (preco,)
+
+    @staticmethod
+    def _numero(dados, campo, tipo, obrigatorio=True):
+        valor = dados.get(campo)
+        if isinstance(valor, str):
+            # Planilhas em português exportam "5,50"
+            valor = valor.strip().replace(',', '.')
+        if valor in (None, ''):
+            if obrigatorio:
+                raise ErroValidacao("Preencha todos os campos obrigatórios.")
+            return None
+        try:
+            numero = float(valor)
+        except (TypeError, ValueError):
+            raise ErroValidacao(f"Valor inválido em '{campo}': {dados.get(campo)}") from None
+        if tipo is int and not numero.is_integer():
+            raise ErroValidacao(f"Valor inválido em '{campo}': {dados.get(campo)}")
+        return tipo(numero)
+
+    @staticmethod
+    def _verificar(erros, registros):
+        if erros:
+            excedentes = len(erros) - LIMITE_ERROS_IMPORTACAO
+            mensagem = "\n".join(f"Linha {linha}: {erro}"
+                                  for linha, erro in sorted(erros)[:LIMITE_ERROS_IMPORTACAO])
+            if excedentes > 0:
+                mensagem += f"\n... e mais {excedentes} erro(s)."
+            raise ErroValidacao(f"Nada foi importado. Corrija o arquivo:\n{mensagem}")
+        if not registros:
+            raise ErroValidacao("Nenhum registro encontrado no arquivo.")
+
+class ExportService:
+    """Exportação de pedidos e relatórios financeiros para CSV ou XLSX.
+
+    As linhas são geradas sob demanda e gravadas direto no arquivo, sem
+    montar a planilha em memória; `exportar` faz a gravação em uma thread.
+    """
+
+    def __init__(self, pedidos, indice_datas, financas, backend=None):
+        self.pedidos = pedidos
+        self.indice_datas = indice_datas
+        self.financas = financas
+        self.backend = backend
+
+    def linhas_pedidos(self, periodo='Tudo', inicio=None, fim=None):
+        """Cabeçalho e uma linha por item dos pedidos do período, em ordem de data.
+
+        Os ids em memória são separados agora; os pedidos só são lidos quando o
+        gerador é consumido, então ele pode ser gravado por outra thread. Os
+        meses que a carga progressiva ainda não trouxe são lidos do backend
+        pela mesma thread, sem passar pela memória do Sistema.
+        """
+        inicio, fim = intervalo_periodo(periodo, inicio=inicio, fim=fim)
+        ids = self.indice_datas.ids_no_periodo(inicio, fim)
+        antigos = ()
+        if self.backend is not None:
+            antigos = self.backend.pedidos_nao_carregados({p.id for p in self.pedidos})
+        return self._gerar_linhas_pedidos(ids, antigos, inicio, fim)
+
+    def _gerar_linhas_pedidos(self, ids, antigos, inicio, fim):
+        def em_memoria():
+            for pedido_id in ids:
+                p = self.pedidos.obter(pedido_id)
+                data = self.indice_datas.data(pedido_id)
+                if p is not None and data is not None:  # senão, excluído durante a exportação
+                    yield data, p.id, p
+
+        def do_backend():
+            for parte in antigos:
+                for p in parte:
+                    data = converter_data(p.data)
+                    if (not inicio or data >= inicio) and (not fim or data < fim):
+                        yield data, p.id, p
+
+        yield COLUNAS_EXPORTACAO
+        # As duas fontes já vêm em ordem de data
+        for _, _, p in heapq.merge(em_memoria(), do_backend()):
+            for item in p.itens:
+                yield [p.id, p.data, p.cliente, p.tipo, p.motoboy, item.produto,
+                       item.quantidade, item.preco_unitario, round(item.total, 2), round(p.total, 2)]
+
+    def linhas_financeiro(self, periodo='Tudo', inicio=None, fim=None):
+        """Relatório do período: totais, canais, motoboys e produtos.
+
+        Os totais dos pedidos em memória são copiados na chamada, para não ler
+        o resumo mantido enquanto outra thread grava o arquivo. Os pedidos dos
+        meses que a carga progressiva ainda não trouxe são somados quando o
+        gerador é consumido, pela thread da exportação.
+        """
+        resumo = self.financas.resumo_periodo(periodo, inicio, fim).copia()
+        produtos = self.financas.totais_por_produto(periodo, inicio, fim)
+        antigos = ()
+        if self.backend is not None:
+            antigos = self.backend.pedidos_nao_carregados({p.id for p in self.pedidos})
+        return self._gerar_linhas_financeiro(resumo, produtos, antigos, periodo, inicio, fim)
+
+    def _gerar_linhas_financeiro(self, f, produtos, antigos, periodo, inicio, fim):
+        de, ate = intervalo_periodo(periodo, inicio=inicio, fim=fim)
+        for parte in antigos:
+            for p in parte:
+                data = converter_data(p.data)
+                if (not de or data >= de) and (not ate or data < ate):
+                    f.adicionar(p)
+                    for item in p.itens:
+                        quantidade, vendas = produtos.get(item.produto, (0, 0))
+                        produtos[item.produto] = (quantidade + item.quantidade, vendas + item.total)
+
+        linhas = [
+            ["Período", periodo if periodo != 'Personalizado' else
+             f"{inicio.strftime('%d/%m/%Y') if inicio else '...'} a {fim.strftime('%d/%m/%Y') if fim else '...'}"],
+            ["Total Vendas", round(f.total_vendas, 2)],
+            ["Total Motoboys", round(f.total_motoboys, 2)],
+            ["Lucro Líquido", round(f.lucro, 2)],
+            [],
+            ["Canal", "Pedidos", "Vendas", "Motoboys"],
+        ]
+        linhas += [[canal, f.pedidos_por_canal.get(canal, 0), round(f.vendas_por_canal.get(canal, 0), 2),
+                    round(f.custo_por_canal.get(canal, 0), 2)] for canal in TIPOS_PEDIDO]
+        linhas += [[], ["Motoboy", "Entregas", "Custo"]]
+        linhas += [[nome, entregas, round(entregas * f.valores.get(nome, 0), 2)]
+                   for nome, entregas in sorted(f.entregas_por_motoboy().items())]
+        linhas += [[], ["Produto", "Quantidade", "Vendas"]]
+        linhas += [[nome, quantidade, round(vendas, 2)] for nome, (quantidade, vendas)
+                   in sorted(produtos.items())]
+        yield from linhas
+
+    @staticmethod
+    def exportar(linhas, arquivo):
+        """Grava as linhas em segundo plano; acompanhe pelo ExportWorker devolvido."""
+        return ExportWorker(linhas, arquivo)
+
+    @staticmethod
+    def gravar(linhas, arquivo):
+        """Grava as linhas em .xlsx ou .csv (conforme a extensão); retorna quantas."""
+        gravar = _gravar_xlsx if arquivo.lower().endswith('.xlsx') else _gravar_csv
+        temporario = arquivo + '.tmp'
+        try:
+            quantidade = gravar(linhas, temporario)
+            os.replace(temporario, arquivo)
+        except BaseException:
+            if os.path.exists(temporario):
+                os.remove(temporario)
+            raise
+        return quantidade
+
+class ExportWorker:
+    """Thread que grava uma exportação; o Tk consulta `concluido` e `erro`.
+
+    A thread não é daemon: o interpretador espera a gravação terminar em
+    vez de interrompê-la e deixar o arquivo .tmp para trás.
+    """
+
+    def __init__(self, linhas, arquivo):
+        self.arquivo = arquivo
+        self.linhas = 0
+        self.erro = None
+        self.thread = threading.Thread(target=self._executar, args=(linhas,), name='exportacao')
+        self.thread.start()
+
+    @property
+    def concluido(self):
+        return not self.thread.is_alive()
+
+    def aguardar(self):
+        """Bloqueia até a gravação terminar."""
+        self.thread.join()
+
+    def _executar(self, linhas):
+        try:
+            self.linhas = ExportService.gravar(linhas, self.arquivo)
+        except Exception as e:  # repassado ao Tk, que exibe a mensagem
+            self.erro = e
+
+def _gravar_csv(linhas, arquivo):
+    quantidade = 0
+    # utf-8-sig para o Excel reconhecer a acentuação
+    with open(arquivo, 'w', newline='', encoding='utf-8-sig') as f:
+        escritor = csv.writer(f)
+        for linha in linhas:
+            escritor.writerow(linha)
+            quantidade += 1
+    return quantidade
+
+_XLSX_ARQUIVOS = {
+    '[Content_Types].xml':
+        '<?xml version="1.0" encoding="UTF-8" standalone="yes"?>'
+        '<Types xmlns="http://schemas.openxmlformats.org/package/2006/content-types">'
+        '<Default Extension="rels" ContentType="application/vnd.openxmlformats-package.relationships+xml"/>'
+        '<Default Extension="xml" ContentType="application/xml"/>'
+        '<Override PartName="/xl/workbook.xml" '
+        'ContentType="application/vnd.openxmlformats-officedocument.spreadsheetml.sheet.main+xml"/>'
+        '<Override PartName="/xl/worksheets/sheet1.xml" '
+        'ContentType="application/vnd.openxmlformats-officedocument.spreadsheetml.worksheet+xml"/>'
+        '</Types>',
+    '_rels/.rels':
+        '<?xml version="1.0" encoding="UTF-8" standalone="yes"?>'
+        '<Relationships xmlns="http://schemas.openxmlformats.org/package/2006/relationships">'
+        '<Relationship Id="rId1" Target="xl/workbook.xml" Type="http://schemas.openxmlformats.org/'
+        'officeDocument/2006/relationships/officeDocument"/>'
+        '</Relationships>',
+    'xl/workbook.xml':
+        '<?xml version="1.0" encoding="UTF-8" standalone="yes"?>'
+        '<workbook xmlns="http://schemas.openxmlformats.org/spreadsheetml/2006/main" '
+        'xmlns:r="http://schemas.openxmlformats.org/officeDocument/2006/relationships">'
+        '<sheets><sheet name="Control" sheetId="1" r:id="rId1"/></sheets>'
+        '</workbook>',
+    'xl/_rels/workbook.xml.rels':
+        '<?xml version="1.0" encoding="UTF-8" standalone="yes"?>'
+        '<Relationships xmlns="http://schemas.openxmlformats.org/package/2006/relationships">'
+        '<Relationship Id="rId1" Target="worksheets/sheet1.xml" Type="http://schemas.openxmlformats.org/'
+        'officeDocument/2006/relationships/worksheet"/>'
+        '</Relationships>',
+}
+
+def _gravar_xlsx(linhas, arquivo):
+    # Planilha mínima (Office Open XML) escrita linha a linha dentro do zip,
+    # sem depender de bibliotecas externas
+    quantidade = 0
+    with zipfile.ZipFile(arquivo, 'w', zipfile.ZIP_DEFLATED) as pacote:
+        for nome, conteudo in _XLSX_ARQUIVOS.items():
+            pacote.writestr(nome, conteudo)
+        with pacote.open('xl/worksheets/sheet1.xml', 'w', force_zip64=True) as f:
+            f.write(b'<?xml version="1.0" encoding="UTF-8" standalone="yes"?>'
+                    b'<worksheet xmlns="http://schemas.openxmlformats.org/spreadsheetml/2006/main">'
+                    b'<sheetData>')
+            for linha in linhas:
+                quantidade += 1
+                celulas = ''.join(
+                    f'<c><v>{valor}</v></c>' if isinstance(valor, (int, float)) else
+                    f'<c t="inlineStr"><is><t xml:space="preserve">{escape(str(valor))}</t></is></c>'
+                    for valor in linha)
+                f.write(f'<row r="{quantidade}">{celulas}</row>'.encode('utf-8'))
+            f.write(b'</sheetData></worksheet>')
+    return quantidade
+
+class Sistema:
+    """Carrega os dados de um backend e liga os serviços, sem depender do Tk.
+
+    Com `progressivo=True` apenas produtos e motoboys são carregados no
+    construtor; os pedidos entram aos poucos, dos mais recentes aos mais
+    antigos, a cada chamada de `carregar_proxima_parte` (no JsonBackend, um
+    mês por vez; `carregar_ate` carrega só os meses de um período).
+    """
+
+    def __init__(self, backend, progressivo=False):
+        self.backend = backend
+        self.produtos = Repositorio(backend.carregar('produtos'), CHAVES['produtos'])
+        self.motoboys = Repositorio(backend.carregar('motoboys'), CHAVES['motoboys'])
+        self.pedidos = RepositorioOrdenado((), CHAVES['pedidos'])
+        self.indice_datas = IndiceDatas()
+        self.indice_motoboys = IndiceMotoboys()
+
+        self.financas = FinanceService(self.pedidos, self.motoboys, self.indice_datas,
+                                       ColunasPedidos() if ARMAZENAMENTO_COLUNAR else None)
+        self.servico_produtos = ProductService(self.produtos, backend)
+        self.servico_motoboys = CourierService(self.motoboys, self.indice_motoboys, self.financas, backend)
+        self.servico_pedidos = OrderService(self.pedidos, self.produtos, self.motoboys, self.indice_datas,
+                                            self.indice_motoboys, self.financas, backend)
+        self.importacao = ImportService(self.servico_produtos, self.servico_pedidos)
+        self.exportacao = ExportService(self.pedidos, self.indice_datas, self.financas, backend)
+
+        self._partes_pedidos = backend.carregar_em_partes('pedidos')
+        if not progressivo:
+            self.concluir_carga()
+
+    @property
+    def carregando(self):
+        return self._partes_pedidos is not None
+
+    def carregar_proxima_parte(self):
+        """Incorpora o próximo bloco de pedidos; retorna False quando não há mais."""
+        if self._partes_pedidos is None:
+            return False
+        parte = next(self._partes_pedidos, None)
+        if parte is None:
+            self._partes_pedidos = None
+            return False
+        self.servico_pedidos.incorporar(parte)
+        return True
+
+    def concluir_carga(self):
+        while self.carregar_proxima_parte():
+            pass
+
+    def carregar_ate(self, inicio):
+        """Carrega as partições mensais até cobrir os pedidos a partir de `inicio`.
+
+        Retorna False, sem carregar nada, quando isso exigiria o histórico
+        inteiro (`inicio` None ou backend sem partições); nesse caso cabe a
+        quem chama usar carregar_proxima_parte ou concluir_carga.
+        """
+        if inicio is None or not self.backend.particionado:
+            return False
+        mes = inicio.strftime('%Y-%m')
+        while self.carregando:
+            pendente = self.backend.particao_pendente()
+            if pendente is not None and pendente < mes:
+                break
+            self.carregar_proxima_parte()
+        return True
+
+    def carregar_do_motoboy(self, nome, quantidade):
+        """Carrega partes até haver `quantidade` pedidos do motoboy em memória.
+
+        Para antes disso quando nenhum mês pendente tem pedidos dele, sem ler
+        o restante do histórico.
+        """
+        while (self.carregando and self.indice_motoboys.quantidade(nome) < quantidade
+               and self.backend.motoboys_nao_carregados().get(nome)):
+            self.carregar_proxima_parte()
+
+    def fechar(self):
+        self.backend.fechar()
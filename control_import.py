@@ -0,0 +1,41 @@
+"""Importação em lote pela linha de comando, sem abrir a interface.
+
+    python control_import.py produtos produtos.csv
+    python control_import.py pedidos historico.jsonl --backend sqlite
+"""
+
+import argparse
+import csv
+import sys
+
+from control_core import BACKEND, BACKENDS, ErroValidacao, Sistema, criar_backend
+
+
+def main(argv=None):
+    parser = argparse.ArgumentParser(description="Importa produtos ou pedidos de um CSV ou JSON-lines.")
+    parser.add_argument('tipo', choices=['produtos', 'pedidos'])
+    parser.add_argument('arquivo')
+    parser.add_argument('--backend', choices=sorted(BACKENDS), default=BACKEND)
+    args = parser.parse_args(argv)
+
+    sistema = Sistema(criar_backend(args.backend))
+    try:
+        if args.tipo == 'produtos':
+            quantidade = sistema.importacao.importar_produtos(args.arquivo)
+        else:
+            quantidade = sistema.importacao.importar_pedidos(args.arquivo)
+    except ErroValidacao as e:
+        print(e, file=sys.stderr)
+        return 1
+    except (OSError, UnicodeDecodeError, csv.Error) as e:
+        print(f"Não foi possível ler o arquivo: {e}", file=sys.stderr)
+        return 1
+    finally:
+        sistema.fechar()
+
+    print(f"{quantidade} {args.tipo} importado(s).")
+    return 0
+
+
+if __name__ == '__main__':
+    sys.exit(main())
@@ -0,0 +1,25 @@
+"""Fixtures comuns: cada teste roda em um diretório vazio com o núcleo importável."""
+import os
+import sys
+
+import pytest
+
+sys.path.insert(0, os.path.join(os.path.dirname(os.path.abspath(__file__)), '..'))
+
+from control_core import Sistema, criar_backend  # noqa: E402
+
+
+@pytest.fixture
+def diretorio(tmp_path, monkeypatch):
+    # DADOS usa caminhos relativos ao diretório atual
+    monkeypatch.chdir(tmp_path)
+    return tmp_path
+
+
+@pytest.fixture
+def sistema(diretorio):
+    """Sistema com o JsonBackend e 1000 unidades do produto 'Pão' a R$ 2,00."""
+    sistema = Sistema(criar_backend('json'))
+    sistema.servico_produtos.salvar('Pão', 1000, 2.0)
+    yield sistema
+    sistema.fechar()
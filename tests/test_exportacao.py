@@ -0,0 +1,84 @@
+"""Exportação de pedidos com parte do histórico ainda não carregada."""
+from datetime import datetime
+import os
+
+import pytest
+
+import control_core
+from control_core import JsonBackend, SQLiteBackend, Sistema
+
+
+@pytest.fixture(params=['json', 'sqlite'])
+def abrir(request, diretorio, monkeypatch):
+    """Abre Sistemas sobre um histórico de seis meses no backend do parâmetro."""
+    # Partes pequenas: a carga progressiva para antes do histórico inteiro
+    monkeypatch.setattr(control_core, 'LIMITE_COMPACTACAO', 1)
+
+    def abrir(progressivo=False):
+        backend = JsonBackend() if request.param == 'json' else SQLiteBackend(tamanho_parte=5)
+        return Sistema(backend, progressivo=progressivo)
+
+    sistema = abrir()
+    sistema.servico_produtos.salvar('Pão', 1000, 2.0)
+    for mes in range(1, 7):
+        for dia in (3, 1, 2):
+            sistema.servico_pedidos.criar(f'{dia}/{mes}', 'Loja', [('Pão', 1)], data=f'{dia:02d}/{mes:02d}/2025 10:00')
+    sistema.servico_pedidos.criar('sem data', 'Loja', [('Pão', 1)], data='lixo')
+    sistema.fechar()
+    return abrir
+
+
+def exportar(sistema):
+    return [linha[:3] for linha in sistema.exportacao.linhas_pedidos()]
+
+
+def test_exportacao_le_meses_nao_carregados(abrir):
+    sistema = abrir(progressivo=True)
+    sistema.carregar_proxima_parte()
+    antes = len(sistema.pedidos)
+    assert sistema.carregando and antes < 19
+    sistema.servico_pedidos.excluir([p.id for p in sistema.pedidos if p.cliente == '3/6'])
+    sistema.servico_pedidos.criar('novo', 'Loja', [('Pão', 1)], data='15/01/2025 10:00')
+    linhas = exportar(sistema)
+    assert len(sistema.pedidos) == antes
+    sistema.fechar()
+
+    completo = abrir()
+    assert linhas == exportar(completo)
+    assert [linha[2] for linha in linhas[1:4]] == ['sem data', '1/1', '2/1']
+    assert len(linhas) == 1 + 6 * 3 + 1
+    assert '3/6' not in [linha[2] for linha in linhas]
+    completo.fechar()
+
+
+@pytest.mark.parametrize('periodo, inicio, fim', [
+    ('Tudo', None, None),
+    ('Personalizado', datetime(2025, 2, 2), None),
+    ('Personalizado', datetime(2025, 3, 1), datetime(2025, 4, 2)),
+])
+def test_relatorio_financeiro_soma_meses_nao_carregados(abrir, periodo, inicio, fim):
+    sistema = abrir(progressivo=True)
+    sistema.servico_motoboys.salvar('Zé', 3.0)
+    sistema.servico_pedidos.criar('entrega', 'iFood', [('Pão', 2)], 'Zé', data='02/03/2025 10:00')
+    sistema.carregar_proxima_parte()
+    antes = len(sistema.pedidos)
+    linhas = list(sistema.exportacao.linhas_financeiro(periodo, inicio, fim))
+    assert len(sistema.pedidos) == antes and sistema.carregando
+    sistema.fechar()
+
+    completo = abrir()
+    assert linhas == list(completo.exportacao.linhas_financeiro(periodo, inicio, fim))
+    completo.fechar()
+
+
+def test_exportacao_aguardada_nao_deixa_temporario(abrir, diretorio):
+    sistema = abrir(progressivo=True)
+    arquivo = str(diretorio / 'pedidos.csv')
+    exportacao = sistema.exportacao.exportar(sistema.exportacao.linhas_pedidos(), arquivo)
+    assert not exportacao.thread.daemon
+    exportacao.aguardar()
+    sistema.fechar()
+
+    assert exportacao.concluido and exportacao.erro is None
+    assert exportacao.linhas == 1 + 6 * 3 + 1
+    assert not os.path.exists(arquivo + '.tmp')
@@ -0,0 +1,26 @@
+"""Conferência dos totais financeiros mantidos aos poucos."""
+import pytest
+
+import control_core
+
+
+@pytest.fixture
+def sistema(sistema):
+    sistema.servico_motoboys.salvar('Zé', 5.0)
+    for tipo in ('Loja', 'iFood', 'Robô'):
+        sistema.servico_pedidos.criar('ana', tipo, [('Pão', 2)], 'Zé')
+    return sistema
+
+
+def test_recalcular_sem_divergencia(sistema):
+    assert not sistema.financas.recalcular()
+
+
+@pytest.mark.skipif(not control_core.ARMAZENAMENTO_COLUNAR, reason="cópia colunar desligada")
+def test_recalcular_detecta_colunas_divergentes(sistema):
+    total = sistema.financas.resumo.total_vendas
+    sistema.financas.colunas.totais[0] += 10
+
+    assert sistema.financas.recalcular()
+    assert sistema.financas.resumo.total_vendas == pytest.approx(total)
+    assert not sistema.financas.recalcular()
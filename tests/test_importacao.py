@@ -0,0 +1,26 @@
+"""Validação dos arquivos importados."""
+import pytest
+
+from control_core import ErroValidacao
+
+
+def test_tipo_invalido_e_informado_antes_do_motoboy(sistema, tmp_path):
+    arquivo = tmp_path / 'pedidos.csv'
+    arquivo.write_text('cliente,tipo,produto,quantidade\nana,Moto,Pão,1\n', encoding='utf-8')
+
+    with pytest.raises(ErroValidacao, match='Linha 2: Tipo de pedido inválido: Moto'):
+        sistema.importacao.importar_pedidos(str(arquivo))
+    assert len(sistema.pedidos) == 0
+
+
+def test_pedidos_importados_numerados_em_ordem_de_data(sistema, tmp_path):
+    sistema.servico_pedidos.criar('hoje', 'Loja', [('Pão', 1)])
+    arquivo = tmp_path / 'pedidos.csv'
+    arquivo.write_text('pedido,cliente,tipo,produto,quantidade,data\n'
+                       '7,março,Loja,Pão,1,10/03/2024 10:00\n'
+                       '3,janeiro,Loja,Pão,1,10/01/2024 10:00\n'
+                       '9,fevereiro,Loja,Pão,1,10/02/2024 10:00\n', encoding='utf-8')
+
+    assert sistema.importacao.importar_pedidos(str(arquivo)) == 3
+    assert [p.cliente for p in sistema.pedidos.fatia(0, 4, decrescente=True)] == [
+        'março', 'fevereiro', 'janeiro', 'hoje']
@@ -0,0 +1,94 @@
+"""Motoboys em uso com parte do histórico ainda não carregada."""
+import os
+
+import pytest
+
+import control_core
+from control_core import ErroValidacao, JsonBackend, Sistema, criar_backend
+
+
+@pytest.fixture
+def backend(diretorio, monkeypatch):
+    # Cada pedido vai direto para a sua partição mensal
+    monkeypatch.setattr(control_core, 'LIMITE_COMPACTACAO', 1)
+    sistema = Sistema(criar_backend('json'))
+    sistema.servico_produtos.salvar('Pão', 1000, 2.0)
+    for nome in ('Zé', 'Bia', 'Ana'):
+        sistema.servico_motoboys.salvar(nome, 5.0)
+    sistema.servico_pedidos.criar('antigo', 'iFood', [('Pão', 1)], 'Zé', data='10/03/2025 10:00')
+    sistema.servico_pedidos.criar('excluído', 'iFood', [('Pão', 1)], 'Bia', data='10/04/2025 10:00')
+    for mes in range(4, 8):
+        sistema.servico_pedidos.criar('loja', 'Loja', [('Pão', 1)], data=f'10/{mes:02d}/2025 10:00')
+    sistema.fechar()
+
+    # Exclusão ainda no journal: o manifesto continua contando o pedido da Bia
+    monkeypatch.setattr(control_core, 'LIMITE_COMPACTACAO', 500)
+    sistema = Sistema(criar_backend('json'))
+    sistema.servico_pedidos.excluir([p.id for p in sistema.pedidos if p.motoboy == 'Bia'])
+    sistema.fechar()
+    return 'json'
+
+
+@pytest.fixture
+def lidos(monkeypatch):
+    meses = []
+    ler_particao = JsonBackend._ler_particao
+
+    def registrar_leitura(self, mes, cache=False):
+        meses.append(mes)
+        return ler_particao(self, mes, cache)
+
+    monkeypatch.setattr(JsonBackend, '_ler_particao', registrar_leitura)
+    return meses
+
+
+def test_em_uso_le_so_os_meses_do_motoboy(backend, lidos):
+    sistema = Sistema(criar_backend(backend), progressivo=True)
+    sistema.carregar_proxima_parte()
+    assert sistema.carregando
+    del lidos[:]
+
+    assert sistema.servico_motoboys.em_uso('Zé')
+    assert lidos == ['2025-03']
+    del lidos[:]
+    assert not sistema.servico_motoboys.em_uso('Ana')
+    assert lidos == []
+    assert not sistema.servico_motoboys.em_uso('Bia')
+    assert lidos == ['2025-04']
+
+    with pytest.raises(ErroValidacao, match='Zé'):
+        sistema.servico_motoboys.excluir(['Zé'])
+    assert sistema.servico_motoboys.excluir(['Ana', 'Bia']) == ['Ana', 'Bia']
+    assert sistema.carregando
+    sistema.fechar()
+
+
+def test_carregar_do_motoboy_para_no_ultimo_mes_dele(backend):
+    sistema = Sistema(criar_backend(backend), progressivo=True)
+    sistema.carregar_do_motoboy('Zé', 10)
+    assert [p.cliente for p in sistema.pedidos if p.motoboy == 'Zé'] == ['antigo']
+    assert not sistema.backend.motoboys_nao_carregados().get('Zé')
+    sistema.fechar()
+
+
+def test_manifesto_sem_contagens_e_completado(backend):
+    arquivo = os.path.join(control_core.DADOS['pedidos_particoes'], 'manifesto.json')
+    manifesto = control_core.DataManager.carregar(arquivo)
+    for particao in manifesto['particoes'].values():
+        del particao['motoboys']
+    control_core.DataManager.salvar(arquivo, manifesto)
+
+    sistema = Sistema(criar_backend(backend), progressivo=True)
+    assert sistema.backend.motoboys_nao_carregados() == {'Zé': 1, 'Bia': 1, 'Retirada na Loja': 4}
+    sistema.fechar()
+    assert all('motoboys' in p for p in control_core.DataManager.carregar(arquivo)['particoes'].values())
+
+
+def test_sqlite_conta_motoboys_nao_carregados(backend):
+    sistema = Sistema(criar_backend('sqlite'), progressivo=True)
+    assert sistema.backend.motoboys_nao_carregados()['Zé'] == 1
+    assert 'Bia' not in sistema.backend.motoboys_nao_carregados()
+    assert sistema.servico_motoboys.em_uso('Zé')
+    sistema.concluir_carga()
+    assert not sistema.backend.motoboys_nao_carregados()
+    sistema.fechar()
@@ -0,0 +1,262 @@
+"""Persistência do JsonBackend: journal, compactação, reabertura e migração."""
+from datetime import datetime
+import os
+
+import pytest
+
+import control_core
+from control_core import DADOS, DataManager, Sistema, criar_backend
+
+
+@pytest.fixture(autouse=True)
+def produtos(diretorio):
+    # Gravado direto no arquivo: vale também para a migração ao SQLite
+    DataManager.salvar(DADOS['produtos'], [{'nome': 'Pão', 'quantidade': 1000, 'preco': 2.0}])
+
+
+def abrir(progressivo=False):
+    return Sistema(criar_backend('json'), progressivo=progressivo)
+
+
+def criar(sistema, cliente='ana', data=None):
+    return sistema.servico_pedidos.criar(cliente, 'Loja', [('Pão', 1)], data=data)
+
+
+def test_reabertura_apos_excluir_nao_reaproveita_id():
+    sistema = abrir()
+    ids = [criar(sistema).id for _ in range(3)]
+    sistema.servico_pedidos.excluir([ids[-1]])
+    sistema.fechar()
+
+    sistema = abrir()
+    assert criar(sistema).id == ids[-1] + 1
+
+
+def test_pedido_criado_durante_carga_progressiva_nao_colide():
+    sistema = abrir()
+    criar(sistema, 'primeiro')
+    criar(sistema, 'segundo')
+    sistema.fechar()
+
+    sistema = abrir(progressivo=True)
+    novo = criar(sistema, 'novo')
+    sistema.concluir_carga()
+    assert novo.id == 3
+    assert sorted(p.cliente for p in sistema.pedidos) == ['novo', 'primeiro', 'segundo']
+    sistema.fechar()
+
+    assert sorted(p.cliente for p in abrir().pedidos) == ['novo', 'primeiro', 'segundo']
+
+
+def test_migracao_de_pedidos_sem_id():
+    # Formato antigo: sem id, sem cliente e com o produto nos campos do pedido
+    antigo = {'data': '03/06/2025 19:47', 'tipo': 'Loja', 'produto': 'Pão', 'quantidade': 1,
+              'preco_unitario': 2.0, 'motoboy': 'Retirada na Loja', 'total': 2.0}
+    DataManager.salvar(DADOS['pedidos'], [dict(antigo), {**antigo, 'id': 5}, dict(antigo)])
+
+    sistema = abrir()
+    assert sorted(p.id for p in sistema.pedidos) == [5, 6, 7]
+    assert criar(sistema).id == 8
+    sistema.fechar()
+
+    assert not os.path.exists(DADOS['pedidos'])
+    assert sorted(p.id for p in abrir().pedidos) == [5, 6, 7, 8]
+
+
+def arvore(diretorio):
+    return sorted(os.path.relpath(os.path.join(raiz, nome), diretorio)
+                  for raiz, _, nomes in os.walk(diretorio) for nome in nomes)
+
+
+def test_migracao_sqlite_nao_altera_os_json(diretorio):
+    sistema = abrir()
+    for _ in range(3):
+        criar(sistema)
+    sistema.servico_pedidos.excluir([2])
+    sistema.fechar()
+    antes = arvore(diretorio)
+
+    sistema = Sistema(criar_backend('sqlite'))
+    assert sorted(p.id for p in sistema.pedidos) == [1, 3]
+    assert criar(sistema).id == 4
+    sistema.fechar()
+    assert [a for a in arvore(diretorio) if not a.startswith(DADOS['sqlite'])] == antes
+
+
+def test_migracao_sqlite_do_arquivo_antigo(diretorio):
+    antigo = {'cliente': 'x', 'data': '03/06/2025 19:47', 'tipo': 'Loja', 'motoboy': 'Retirada na Loja',
+              'itens': [{'produto': 'Pão', 'quantidade': 1, 'preco_unitario': 2.0}], 'total': 2.0}
+    DataManager.salvar(DADOS['pedidos'], [{**antigo, 'id': 2}, dict(antigo)])
+
+    sistema = Sistema(criar_backend('sqlite'))
+    assert sorted(p.id for p in sistema.pedidos) == [2, 3]
+    sistema.fechar()
+    assert os.path.exists(DADOS['pedidos'])
+    assert not os.path.exists(DADOS['pedidos_particoes'])
+
+
+def test_cache_binario_refeito_so_na_leitura():
+    arquivo = DADOS['produtos'] + control_core.EXTENSAO_CACHE
+    assert not os.path.exists(arquivo)
+    sistema = abrir()
+    assert os.path.exists(arquivo)
+    antes = os.path.getmtime(arquivo)
+    sistema.servico_produtos.salvar('Café', 5, 7.5)
+    sistema.fechar()
+    assert os.path.getmtime(arquivo) == antes
+
+    assert {p.nome for p in abrir().produtos} == {'Pão', 'Café'}
+    assert os.path.getmtime(arquivo) != antes
+
+
+def test_compactar_e_reabrir(monkeypatch):
+    monkeypatch.setattr(control_core, 'LIMITE_COMPACTACAO', 4)
+    sistema = abrir()
+    for dia in range(1, 6):
+        criar(sistema, f'dia {dia}', data=f'{dia:02d}/01/2025 10:00')
+    sistema.servico_pedidos.excluir([2])
+    sistema.fechar()
+
+    manifesto = DataManager.carregar(os.path.join(DADOS['pedidos_particoes'], 'manifesto.json'))
+    assert manifesto['particoes']['2025-01']['pedidos'] >= 4
+    sistema = abrir()
+    assert sorted(p.cliente for p in sistema.pedidos) == ['dia 1', 'dia 3', 'dia 4', 'dia 5']
+    assert criar(sistema).id == 6
+    sistema.fechar()
+
+
+@pytest.mark.parametrize('compressao, extensao', [('gzip', '.gz'), ('lzma', '.xz')])
+def test_meses_encerrados_arquivados_e_lidos(monkeypatch, compressao, extensao):
+    monkeypatch.setattr(control_core, 'COMPRESSAO', compressao)
+    # Compacta a cada pedido: só as partições (não o journal) são arquivadas
+    monkeypatch.setattr(control_core, 'LIMITE_COMPACTACAO', 1)
+    sistema = abrir()
+    criar(sistema, 'antigo', data='10/03/2024 09:00')
+    criar(sistema, 'atual')
+    sistema.fechar()
+
+    arquivados = os.path.join(DADOS['pedidos_particoes'], control_core.DIRETORIO_ARQUIVADOS)
+    assert os.listdir(arquivados) == [f'2024-03.json{extensao}']
+
+    sistema = abrir(progressivo=True)
+    sistema.carregar_proxima_parte()
+    assert [p.cliente for p in sistema.pedidos] == ['atual']
+    sistema.concluir_carga()
+    assert sorted(p.cliente for p in sistema.pedidos) == ['antigo', 'atual']
+    sistema.fechar()
+
+
+def test_falha_no_journal_nao_perde_pedidos(monkeypatch):
+    registrar = DataManager.registrar
+    falhas = []
+
+    def registrar_falhando_uma_vez(arquivo, eventos):
+        if not falhas:
+            falhas.append(arquivo)
+            raise OSError("disco cheio")
+        registrar(arquivo, eventos)
+
+    monkeypatch.setattr(DataManager, 'registrar', staticmethod(registrar_falhando_uma_vez))
+    erros = []
+    sistema = Sistema(control_core.PersistenceWorker(criar_backend('json'), ao_falhar=erros.append))
+    criar(sistema, 'primeiro')
+    sistema.backend.aguardar()
+    sistema.backend.processar_resultados()
+    assert len(erros) == 1
+    criar(sistema, 'segundo')
+    sistema.fechar()
+
+    sistema = abrir()
+    assert sorted(p.cliente for p in sistema.pedidos) == ['primeiro', 'segundo']
+    assert sistema.produtos.obter('Pão').quantidade == 998
+    sistema.fechar()
+
+
+def test_falha_no_journal_regravada_ao_fechar(monkeypatch):
+    registrar = DataManager.registrar
+    disco_cheio = [True]
+
+    def registrar_se_houver_espaco(arquivo, eventos):
+        if disco_cheio[0]:
+            raise OSError("disco cheio")
+        registrar(arquivo, eventos)
+
+    monkeypatch.setattr(DataManager, 'registrar', staticmethod(registrar_se_houver_espaco))
+    sistema = abrir()
+    with pytest.raises(OSError):
+        criar(sistema)
+    disco_cheio[0] = False
+    sistema.fechar()
+
+    assert [p.id for p in abrir().pedidos] == [1]
+
+
+def test_journal_sem_linha_cortada_apos_falha(monkeypatch):
+    def fsync_falhando(descritor):
+        raise OSError("disco cheio")
+
+    sistema = abrir()
+    criar(sistema, 'primeiro')
+    monkeypatch.setattr(os, 'fsync', fsync_falhando)
+    with pytest.raises(OSError):
+        criar(sistema, 'segundo')
+    monkeypatch.setattr(os, 'fsync', lambda descritor: None)
+    sistema.fechar()
+
+    assert sorted(p.cliente for p in abrir().pedidos) == ['primeiro', 'segundo']
+
+
+def test_lote_sqlite_desfeito_quando_falha(monkeypatch):
+    sistema = Sistema(criar_backend('sqlite'))
+    upsert = control_core.SQLiteBackend._upsert
+
+    def upsert_sem_pedidos(self, colecao, registros):
+        if colecao == 'pedidos':
+            raise control_core.sqlite3.OperationalError("disco cheio")
+        upsert(self, colecao, registros)
+
+    monkeypatch.setattr(control_core.SQLiteBackend, '_upsert', upsert_sem_pedidos)
+    with pytest.raises(control_core.sqlite3.OperationalError):
+        criar(sistema)
+    sistema.fechar()
+    monkeypatch.setattr(control_core.SQLiteBackend, '_upsert', upsert)
+
+    sistema = Sistema(criar_backend('sqlite'))
+    assert len(sistema.pedidos) == 0
+    assert sistema.produtos.obter('Pão').quantidade == 1000
+    sistema.fechar()
+
+
+@pytest.mark.parametrize('nome', ['json', 'sqlite'])
+def test_pedido_criado_durante_carga_nao_e_contado_duas_vezes(nome):
+    sistema = Sistema(criar_backend(nome))
+    for _ in range(3):
+        criar(sistema)
+    sistema.fechar()
+
+    sistema = Sistema(criar_backend(nome), progressivo=True)
+    criar(sistema, 'novo')
+    sistema.concluir_carga()
+    assert len(sistema.pedidos) == 4
+    assert not sistema.financas.recalcular()
+    sistema.fechar()
+
+
+def test_compactacao_nao_refaz_cache_das_particoes(monkeypatch):
+    monkeypatch.setattr(control_core, 'LIMITE_COMPACTACAO', 4)
+    gravacoes = []
+    gravar_cache = DataManager._gravar_cache
+    monkeypatch.setattr(DataManager, '_gravar_cache', staticmethod(
+        lambda arquivo, dados, assinatura: gravacoes.append(arquivo) or gravar_cache(arquivo, dados, assinatura)))
+    sistema = abrir()
+    del gravacoes[:]
+    for _ in range(20):
+        criar(sistema)
+    sistema.servico_pedidos.excluir([3])
+    sistema.fechar()
+    assert gravacoes == []
+
+    sistema = abrir()
+    assert len(sistema.pedidos) == 19
+    assert [os.path.basename(a) for a in gravacoes] == [DADOS['produtos'], f"{datetime.now():%Y-%m}.json"]
+    sistema.fechar()